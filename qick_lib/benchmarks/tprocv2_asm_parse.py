@@ -0,0 +1,109 @@
+"""
+Benchmark for the tProc v2 text assembler: compares the reference parser (Assembler.get_list)
+with the table-driven parser (Assembler.parse_list) on large generated programs.
+
+Both parsers are run on the same ASM, and their outputs (program list, label dictionary) are checked for equality.
+
+Usage (from any directory; the qick_lib checkout containing this script is used, not an installed qick):
+    python tprocv2_asm_parse.py [--lines 10000 20000] [--repeat 3] [--seed 0]
+"""
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+# make the qick package in this checkout importable
+here = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, (here / '..').resolve().as_posix())
+
+from qick.tprocv2_assembler import Assembler, Alias_List
+
+# instruction templates, in the style of the ASM generated by QickProgramV2
+TEMPLATES = [
+    "REG_WR r{r} imm #{n}",
+    "REG_WR r{r} op -op(r{r2} + #{n})",
+    "REG_WR w_freq imm #{n}",
+    "REG_WR s_zero imm #0",
+    "REG_WR r_wave wmem [&{addr}]",
+    "REG_WR s15 label {label}",
+    "REG_WR s12 op -op(s12 + #1)",
+    "WPORT_WR p{port} wmem [&{addr}] @{t}",
+    "WPORT_WR p{port} r_wave @{t}",
+    "TRIG p{trig} set @{t}",
+    "TRIG p{trig} clr @{t}",
+    "DPORT_WR p{dport} imm {n} @{t}",
+    "DMEM_WR [&{addr}] imm #{n}",
+    "WMEM_WR [&{addr}]",
+    "TIME #{n} inc_ref",
+    "TIME set_ref r{r}",
+    "TEST -op(r{r} - #{n})",
+    "JUMP {label} -if(NZ) -wr(r{r} op) -op(r{r} + #1)",
+    "JUMP [s15] -if(Z)",
+    "CALL {label}",
+    "WAIT [s15] @{t} time",
+    "ARITH T r{r} r{r2}",
+    "DIV r{r} #{n}",
+    "FLAG set",
+    "NOP",
+]
+
+def make_program(n_lines, seed=0, label_every=50):
+    """
+    Generate ASM with about n_lines instructions, with a label every label_every lines.
+    """
+    rng = random.Random(seed)
+    n_labels = -(-n_lines // label_every)
+    labels = ["L%d" % (i) for i in range(n_labels)]
+    lines = []
+    for i in range(n_lines):
+        if i % label_every == 0:
+            lines.append(labels[i // label_every] + ":")
+        template = rng.choice(TEMPLATES)
+        lines.append("     " + template.format(r=rng.randrange(16), r2=rng.randrange(16), n=rng.randrange(1000),
+                                              addr=rng.randrange(256), label=rng.choice(labels + ['NEXT', 'SKIP']),
+                                              port=rng.randrange(16), trig=rng.randrange(32), dport=rng.randrange(4),
+                                              t=rng.randrange(10000)))
+    lines.append("     JUMP HERE")
+    return "\n".join(lines)
+
+def strip_lines(asm):
+    parsed = []
+    for line in asm.splitlines():
+        comment = line.find("//")
+        if (comment >= 0):
+            line = line[:comment]
+        parsed.append(line.strip())
+    return parsed
+
+def run(parser, lines, repeat):
+    # parsing can add entries to Alias_List (.ALIAS/.CONST), so restore it each time
+    aliases = dict(Alias_List)
+    best = None
+    for i in range(repeat):
+        Alias_List.clear()
+        Alias_List.update(aliases)
+        t_start = time.perf_counter()
+        result = parser(lines)
+        elapsed = time.perf_counter() - t_start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--lines', type=int, nargs='+', default=[1000, 10000, 20000], help="program sizes (instructions)")
+    argparser.add_argument('--repeat', type=int, default=3, help="timing runs per parser (the best is reported)")
+    argparser.add_argument('--seed', type=int, default=0, help="random seed for the generated programs")
+    args = argparser.parse_args()
+
+    print("%8s %12s %14s %8s" % ("lines", "get_list [s]", "parse_list [s]", "speedup"))
+    for n_lines in args.lines:
+        lines = strip_lines(make_program(n_lines, seed=args.seed))
+        ref, t_ref = run(Assembler.get_list, lines, args.repeat)
+        new, t_new = run(Assembler.parse_list, lines, args.repeat)
+        if ref != new:
+            raise RuntimeError("parsers disagree on the %d-line program" % (n_lines))
+        print("%8d %12.3f %14.3f %8.1f" % (n_lines, t_ref, t_new, t_ref/t_new))
+
+if __name__ == '__main__':
+    main()
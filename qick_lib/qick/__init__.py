@@ -59,6 +59,7 @@ except ModuleNotFoundError:
 from .averager_program import AveragerProgram, RAveragerProgram, NDAveragerProgram
 from .qick_asm import QickConfig
 from .asm_v1 import QickProgram
+from .compile_cache import CompileCache
 
 # only import the hardware drivers if running on a Zynq
 # also import if we're in the ReadTheDocs Sphinx build (the imports won't really work but they will be mocked)
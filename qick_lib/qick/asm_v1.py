@@ -1248,6 +1248,12 @@ class QickProgram(AbsQickProgram):
         list of int
             List of binary instructions
         """
+        if debug:
+            self._compile_insts(debug)
+        else:
+            self._compile_cached(self._compile_insts, ['prog_list'], ['binprog'])
+
+    def _compile_insts(self, debug=False):
         labels = {}
         # Scan the ASM instructions for labels. Skip comment lines.
         prog_counter = 0
@@ -9,6 +9,7 @@ from typing import Callable, NamedTuple, Union, Dict
 from abc import ABC, abstractmethod
 from fractions import Fraction
 import copy
+import functools
 from numbers import Number, Integral
 
 from .tprocv2_assembler import Assembler
@@ -18,6 +19,17 @@ from .helpers import to_int, check_bytes, check_keys
 logger = logging.getLogger(__name__)
 
 # user units, multi-dimension
+# conversions from a derived QickParam back to the original, used by QickParam.get_actual_values()
+# these are module-level functions (not lambdas) so programs can be pickled
+def _convert_identity(x):
+    return x
+
+def _convert_offset(x, scalar):
+    return x - scalar
+
+def _convert_scale(x, factor):
+    return x / factor
+
 class QickParam:
     """Defines a parameter for use in pulses or times.
     This may be a floating-point scalar or a multi-dimensional sweep.
@@ -160,7 +172,7 @@ class QickParam:
 
     def __copy__(self):
         self.derived_param = QickParam(self.start, self.spans.copy())
-        self.conversion_from_derived_param = lambda x: x
+        self.conversion_from_derived_param = _convert_identity
         return self.derived_param
     def __add__(self, a):
         if isinstance(a, Number):
@@ -185,7 +197,7 @@ class QickParam:
         # add the scalar to the QickParam
         new_start = param.start + scalar
         param.derived_param = QickParam(new_start, param.spans)
-        param.conversion_from_derived_param = lambda x: x - scalar
+        param.conversion_from_derived_param = functools.partial(_convert_offset, scalar=scalar)
         return param.derived_param
 
     def __radd__(self, a):
@@ -199,7 +211,7 @@ class QickParam:
             new_start = self.start * a
             new_spans = {k: v * a for k, v in self.spans.items()}
             self.derived_param = QickParam(new_start, new_spans)
-            self.conversion_from_derived_param = lambda x: x / a
+            self.conversion_from_derived_param = functools.partial(_convert_scale, factor=a)
             return self.derived_param
         return NotImplemented
     def __neg__(self):
@@ -2155,16 +2167,65 @@ class QickProgramV2(AsmV2, AbsQickProgram):
         d_mem = None
         return d_mem
 
+    # attributes that _make_asm() and _make_binprog() depend on
+    COMPILE_INPUTS = ['envelopes', 'gen_chs', 'ro_chs', 'macro_list', 'pulses', 'waves', 'wave2idx', 'reg_dict']
+    # attributes that _make_asm() and _make_binprog() set or modify
+    COMPILE_OUTPUTS = COMPILE_INPUTS + ['prog_list', 'labels', 'p_addr', 'line', 'time_dict', 'loop_dict', 'loop_stack',
+                                        '_gen_ts', '_ro_ts', 'binprog']
+
     def compile(self):
+        self._compile_cached(self._compile_all, self.COMPILE_INPUTS, self.COMPILE_OUTPUTS)
+        # compile_datamem() may be overridden to depend on things that aren't in the cache key, so always rerun it
+        if self.compile_cache is not None:
+            self.binprog['dmem'] = self.compile_datamem()
+            self._check_mem_sizes()
+
+    def _compile_all(self):
         self._make_asm()
         self._make_binprog()
 
+    def _cache_code_classes(self):
+        # macros may be user-defined subclasses
+        classes = set(super()._cache_code_classes())
+        for macro in self.macro_list:
+            classes.update(type(macro).__mro__)
+        return classes
+
+    def _cache_refs(self):
+        refs = super()._cache_refs()
+        for i, mgr in enumerate(self._gen_mgrs):
+            refs['gen_mgr', i] = mgr
+        for i, mgr in enumerate(self._ro_mgrs):
+            if mgr is not None:
+                refs['ro_mgr', i] = mgr
+        return refs
+
     def _make_binprog(self):
         # convert the low-level program definition (ASM and waveform list) to binary
         self.binprog = {}
         self.binprog['pmem'] = self._compile_prog()
         self.binprog['wmem'] = self._compile_waves()
         self.binprog['dmem'] = self.compile_datamem()
+        # list the memories the program can modify, so the driver knows which ones need to be reloaded between runs
+        self.binprog['mem_writes'] = self._mem_writes()
+        self._check_mem_sizes()
+
+    def _mem_writes(self):
+        """List the tProc memories (wmem, dmem) that the program can write to.
+        wmem is written by WMEM_WR and by any instruction with the -ww flag; dmem is written by DMEM_WR.
+        If an instruction can't be interpreted, both memories are listed, so they will always be reloaded.
+        """
+        writes = set()
+        for inst in self.prog_list:
+            if not isinstance(inst, dict) or 'CMD' not in inst:
+                return ['wmem', 'dmem']
+            if inst['CMD'] == 'WMEM_WR' or 'WW' in inst:
+                writes.add('wmem')
+            if inst['CMD'] == 'DMEM_WR':
+                writes.add('dmem')
+        return [name for name in ['wmem', 'dmem'] if name in writes]
+
+    def _check_mem_sizes(self):
         # check that the program will fit
         for name in ['pmem', 'wmem', 'dmem']:
             progsize = 0
@@ -0,0 +1,237 @@
+"""
+On-disk cache of compiled programs, so structurally identical programs only need to be compiled once.
+"""
+import os
+import io
+import types
+import weakref
+import pickle
+import hashlib
+import logging
+from . import get_version
+
+logger = logging.getLogger(__name__)
+
+class _RefPickler(pickle.Pickler):
+    """
+    Pickler that stores references to the given objects as tokens instead of pickling them.
+    This is used for objects that are shared with the program (the program itself, the firmware config, channel managers).
+    """
+    def __init__(self, f, refs):
+        super().__init__(f, protocol=4)
+        self.ref_ids = {id(v): k for k, v in refs.items()}
+
+    def persistent_id(self, obj):
+        return self.ref_ids.get(id(obj))
+
+class _KeyPickler(_RefPickler):
+    """
+    Pickler for computing cache keys; its output is never unpickled.
+    Set iteration order depends on the hash seed, which changes between Python sessions, so sets are pickled in sorted order.
+    """
+    def persistent_id(self, obj):
+        if type(obj) in (set, frozenset):
+            try:
+                return ('set', tuple(sorted(obj)))
+            except TypeError:
+                return ('set', tuple(sorted(obj, key=repr)))
+        return super().persistent_id(obj)
+
+class _RefUnpickler(pickle.Unpickler):
+    def __init__(self, f, refs):
+        super().__init__(f)
+        self.refs = refs
+
+    def persistent_load(self, pid):
+        return self.refs[pid]
+
+def _hash_code(h, code):
+    h.update(code.co_code)
+    h.update(repr((code.co_names, code.co_varnames)).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(h, const)
+        elif isinstance(const, frozenset):
+            # frozenset order depends on the hash seed
+            h.update(repr(sorted(const, key=repr)).encode())
+        else:
+            h.update(repr(const).encode())
+
+# per-class digests, so classes are only hashed once
+_class_digests = weakref.WeakKeyDictionary()
+
+def _class_digest(cls):
+    digest = _class_digests.get(cls)
+    if digest is None:
+        h = hashlib.sha256()
+        h.update(("%s.%s" % (cls.__module__, cls.__qualname__)).encode())
+        for name, val in sorted(vars(cls).items()):
+            if isinstance(val, (staticmethod, classmethod)):
+                val = val.__func__
+            elif isinstance(val, property):
+                val = val.fget
+            code = getattr(val, '__code__', None)
+            if code is not None:
+                h.update(name.encode())
+                _hash_code(h, code)
+            elif isinstance(val, (bool, int, float, str, tuple, list, dict, type(None))):
+                h.update(repr((name, val)).encode())
+        digest = h.digest()
+        _class_digests[cls] = digest
+    return digest
+
+def code_digest(classes):
+    """
+    Hash the code of the given classes: the bytecode of their methods, and their simple class attributes.
+    Compiled programs depend on the code of the program class (and its parents) and of any user-defined macros,
+    which isn't otherwise captured by the cache key: this digest changes whenever that code is edited and the class is redefined.
+    Each class is only hashed the first time it's seen, so methods that are patched into an existing class are not noticed.
+
+    :param classes: classes to hash
+    :type classes: iterable of type
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    for cls in sorted(set(classes), key=lambda c: (c.__module__, c.__qualname__)):
+        if cls is not object:
+            h.update(_class_digest(cls))
+    return h.hexdigest()
+
+class CompileCache():
+    """
+    Content-addressed cache of compiled programs.
+    Each entry is a pickle file, named by a hash of the program's declarations and the relevant firmware configuration.
+    When there are more than max_entries files, the least recently used ones are deleted.
+
+    Cache files are unpickled, so the cache directory must not be writable by anyone you don't trust.
+
+    :param path: cache directory (default: ~/.cache/qick/compile)
+    :type path: str
+    :param max_entries: maximum number of cached programs
+    :type max_entries: int
+    """
+    # bump this if the cache contents change in a way the library version doesn't capture
+    FORMAT = 1
+
+    def __init__(self, path=None, max_entries=1000):
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'qick', 'compile')
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _dumps(self, obj, refs, pickler=_RefPickler):
+        f = io.BytesIO()
+        pickler(f, refs).dump(obj)
+        return f.getvalue()
+
+    def make_key(self, obj, refs, plain=None):
+        """
+        Compute the cache key for a program.
+
+        :param obj: the program contents that the compiled program depends on
+        :type obj: object
+        :param refs: objects referenced by obj that should be identified by name, not by value
+        :type refs: dict
+        :param plain: other things that the compiled program depends on, hashed by value (typically the firmware config and code_digest())
+        :type plain: object
+        :return: hex digest, or None if obj can't be hashed
+        :rtype: str
+        """
+        try:
+            h = hashlib.sha256(self._dumps((self.FORMAT, get_version(), plain), {}, _KeyPickler))
+            h.update(self._dumps(obj, refs, _KeyPickler))
+        except Exception as e:
+            logger.warning("program can't be cached: %s" % (e))
+            return None
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def get(self, key, refs):
+        """
+        Look up a compiled program.
+
+        :param key: cache key from make_key()
+        :type key: str
+        :param refs: objects to substitute for the references that were stored by put()
+        :type refs: dict
+        :return: the cached object, or None if there is no valid entry
+        :rtype: object
+        """
+        entry = self._entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                obj = _RefUnpickler(f, refs).load()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # a corrupt or incompatible entry: drop it
+            logger.warning("discarding bad compile cache entry %s: %s" % (entry, e))
+            self._remove(entry)
+            self.misses += 1
+            return None
+        # mark as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        self.hits += 1
+        return obj
+
+    def put(self, key, obj, refs):
+        """
+        Store a compiled program.
+
+        :param key: cache key from make_key()
+        :type key: str
+        :param obj: the compilation results
+        :type obj: object
+        :param refs: objects referenced by obj that should be stored by name, not by value
+        :type refs: dict
+        """
+        try:
+            data = self._dumps(obj, refs)
+        except Exception as e:
+            logger.debug("program can't be cached: %s" % (e))
+            return
+        entry = self._entry(key)
+        # write to a temp file and rename, so other processes never see a partial entry
+        tmp = "%s.%d.tmp" % (entry, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, entry)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                entry = os.path.join(self.path, name)
+                try:
+                    entries.append((os.stat(entry).st_mtime, entry))
+                except FileNotFoundError:
+                    pass
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, entry in entries[:len(entries)-self.max_entries]:
+                self._remove(entry)
+
+    def _remove(self, entry):
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Delete all cached programs.
+        """
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                self._remove(os.path.join(self.path, name))
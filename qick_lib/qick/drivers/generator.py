@@ -3,6 +3,7 @@ Drivers for signal generators: FPGA blocks that send data to DACs.
 """
 from pynq.buffer import allocate
 import numpy as np
+import hashlib
 from qick.ip import SocIP
 
 class AbsSignalGen(SocIP):
@@ -47,7 +48,7 @@ class AbsSignalGen(SocIP):
         self.cfg['f_dds'] = self['fs']/self['interpolation']
         self.cfg['fdds_div'] = self['fs_div']*self['interpolation']
 
-    def set_nyquist(self, nqz):
+    def set_nyquist(self, nqz, force=False):
         """Set the Nyquist zone mode for the DAC linked to this generator.
         For tProc-controlled generators, this method is called automatically during program config.
         You should normally only call this method directly for a constant-IQ output.
@@ -57,10 +58,12 @@ class AbsSignalGen(SocIP):
         nqz : int
             Nyquist zone (must be 1 or 2).
             Setting the NQZ to 2 increases output power in the 2nd/3rd Nyquist zones.
+        force : bool
+            force update, even if the setting is the same
         """
-        self.rf.set_nyquist(self['dac'], nqz)
+        self.rf.set_nyquist(self['dac'], nqz, force=force)
 
-    def set_mixer_freq(self, f, ro_ch=None, phase_reset=True):
+    def set_mixer_freq(self, f, ro_ch=None, phase_reset=True, force=False):
         """Set the mixer frequency for the DAC linked to this generator.
         For tProc-controlled generators, this method is called automatically during program config.
         You should normally only call this method directly for a constant-IQ output.
@@ -73,16 +76,18 @@ class AbsSignalGen(SocIP):
             readout channel for frequency matching (use None if you don't want mixer freq to be rounded to a valid readout frequency)
         phase_reset : bool
             if this changes the frequency, also reset the phase (so if we go to freq=0, we end up on the real axis)
+        force : bool
+            force update, even if the setting is the same
         """
         if not self.HAS_MIXER:
             raise NotImplementedError("This channel does not have a mixer.")
         if ro_ch is None:
-            self.rf.set_mixer_freq(self['dac'], f, phase_reset=phase_reset)
+            self.rf.set_mixer_freq(self['dac'], f, phase_reset=phase_reset, force=force)
         else:
             mixercfg = self.soc._get_mixer_cfg(self.cfg)
             rocfg = self.soc['readouts'][ro_ch]
             rounded_f = self.soc.roundfreq(f, [mixercfg, rocfg])
-            self.rf.set_mixer_freq(self['dac'], rounded_f, phase_reset=phase_reset)
+            self.rf.set_mixer_freq(self['dac'], rounded_f, phase_reset=phase_reset, force=force)
 
     def get_mixer_freq(self):
         if not self.HAS_MIXER:
@@ -111,6 +116,9 @@ class AbsArbSignalGen(AbsSignalGen):
         self.switch = None
         self.switch_ch = None
 
+        # what we believe is in the envelope memory: start address -> (length, content hash)
+        self.env_cache = {}
+
         super().__init__(description)
 
     def _init_config(self, description):
@@ -135,14 +143,17 @@ class AbsArbSignalGen(AbsSignalGen):
             self.switch = soc._get_block(switch_path)
 
     # Load waveforms.
-    def load(self, xin, addr=0):
+    def load(self, xin, addr=0, force=False):
         """
-        Load waveform into I,Q envelope
+        Load waveform into I,Q envelope.
+        If the same waveform was already loaded at the same address, the transfer is skipped.
 
         :param xin: array of 16-bit (I, Q) values for pulse envelope
         :type xin: numpy.ndarray of int
         :param addr: starting address
         :type addr: int
+        :param force: load the waveform even if it's already in memory
+        :type force: bool
         """
         length = xin.shape[0]
         assert xin.dtype==np.int16
@@ -161,6 +172,10 @@ class AbsArbSignalGen(AbsSignalGen):
             if np.any(xin[:,1]):
                 raise NotImplementedError("This channel does not support complex envelopes.")
 
+        digest = hashlib.blake2b(np.ascontiguousarray(xin).tobytes(), digest_size=16).digest()
+        if not force and self.env_cache.get(addr) == (length, digest):
+            return
+
         # Route switch to channel.
         if self.switch is not None:
             self.switch.sel(mst=self.switch_ch)
@@ -185,6 +200,19 @@ class AbsArbSignalGen(AbsSignalGen):
         # Disable writes.
         self._wr_disable()
 
+        # forget any cached regions that we just overwrote
+        for start, (n, _) in list(self.env_cache.items()):
+            if start < addr+length and addr < start+n:
+                del self.env_cache[start]
+        self.env_cache[addr] = (length, digest)
+
+    def invalidate_envelopes(self):
+        """
+        Forget what's in the envelope memory, so the next load() of every waveform does a transfer.
+        This must be called if the memory may have been modified by something other than load().
+        """
+        self.env_cache.clear()
+
     def _wr_enable(self, addr=0):
         """
            Enable WE reg
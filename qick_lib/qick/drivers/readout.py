@@ -692,7 +692,7 @@ class AxisAvgBuffer(SocIP):
         self.avg_addr_reg = address
         self.avg_len_reg = length
 
-    def transfer_avg(self, address=0, length=100):
+    def transfer_avg(self, address=0, length=100, out=None):
         """
         Transfer data from accumulated buffer
 
@@ -700,6 +700,8 @@ class AxisAvgBuffer(SocIP):
         :type addr: int
         :param length: number of samples
         :type length: int
+        :param out: destination array of shape (length, 2); if given, the data is written into this array instead of a new one
+        :type out: numpy.ndarray
         :return: I,Q pairs
         :rtype: list
         """
@@ -752,6 +754,10 @@ class AxisAvgBuffer(SocIP):
         else:
             data = data[:length]
 
+        if out is not None:
+            # copy straight into the caller's array, which saves an allocation and a copy
+            np.copyto(out, data)
+            return out
         # data is a view into the data buffer, so copy it before returning
         return data.copy()
 
@@ -354,6 +354,11 @@ class Axis_QICK_Proc(SocIP):
     """
     bindto = ['Fermi:user:qick_processor:2.0',
               'QICK:QICK:qick_processor:2.0']
+
+    # configuration registers that are only written by this driver (the firmware only changes them on AXI writes and AXI reset)
+    # a ProcessDataStreamer worker has its own copy of this driver: it never writes tproc_cfg (the main process does the end-of-job start_src()),
+    # and only sets read_sel, which the main process never reads back: it always writes read_sel before reading the registers it selects
+    SHADOW_REGS = ['tproc_cfg', 'mem_addr', 'mem_len', 'core_cfg', 'read_sel']
     
     def __init__(self, description):
         """
@@ -363,6 +368,8 @@ class Axis_QICK_Proc(SocIP):
 
         # the currently loaded program - cached here to make it easy to reload the memories
         self.binprog = None
+        # memories whose contents currently match the loaded program
+        self.mem_synced = set()
 
     def _init_config(self, description):
         self.REGISTERS = {
@@ -409,15 +416,16 @@ class Axis_QICK_Proc(SocIP):
 
     def _init_firmware(self):
         # Initial Values 
-        self.tproc_ctrl  = 0
-        self.tproc_cfg   = 0
-        self.mem_addr    = 0
-        self.mem_len     = 0
-        self.mem_dt_i    = 0
-        self.axi_w_dt1 = 0
-        self.axi_w_dt2 = 0
-        self.core_cfg    = 0
-        self.read_sel    = 0
+        with self.reg_transaction():
+            self.tproc_ctrl  = 0
+            self.tproc_cfg   = 0
+            self.mem_addr    = 0
+            self.mem_len     = 0
+            self.mem_dt_i    = 0
+            self.axi_w_dt1 = 0
+            self.axi_w_dt2 = 0
+            self.core_cfg    = 0
+            self.read_sel    = 0
 
     # Configure this driver with links to its memory and DMA.
     def configure(self, axi_dma):
@@ -660,12 +668,15 @@ class Axis_QICK_Proc(SocIP):
         if mem_sel not in ['pmem', 'dmem', 'wmem']:
             raise RuntimeError('mem_sel should be pmem/dmem/wmem, current Value : %s' % (mem_sel))
         self.logger.info('tProc %s: loading data'%(mem_sel))
+        # this memory no longer necessarily matches the program
+        self.mem_synced.discard(mem_sel)
 
         # Length.
         length = len(buff_in)
         # Configure Memory arbiter. (Write MEM)
-        self.mem_addr        = addr
-        self.mem_len         = length
+        with self.reg_transaction():
+            self.mem_addr        = addr
+            self.mem_len         = length
 
         # Copy buffer.
         if mem_sel=='dmem':
@@ -721,8 +732,9 @@ class Axis_QICK_Proc(SocIP):
             raise RuntimeError('mem_sel should be pmem/dmem/wmem, current Value : %s' % (mem_sel))
 
         # Configure Memory arbiter. (Read DMEM)
-        self.mem_addr        = addr
-        self.mem_len         = length
+        with self.reg_transaction():
+            self.mem_addr        = addr
+            self.mem_len         = length
 
         #Start operation
         self.tproc_cfg       &= ~63
@@ -744,23 +756,60 @@ class Axis_QICK_Proc(SocIP):
                 return data.ravel()
         return data
 
-    def reload_mem(self):
+    def reload_mem(self, force=False):
         """Reload the waveform and data memory from the most recently written program.
         This undoes any changes made by running the program.
+
+        Only memories that the program can write to (as listed in the program's "mem_writes"), or that have been overwritten since they were last loaded, are actually reloaded.
+
+        :param force: reload all memories, even if they should be unchanged
+        :type force: bool
         """
-        if self.binprog['wmem'] is not None:
-            self.load_mem('wmem', self.binprog['wmem'])
-        if self.binprog['dmem'] is not None:
-            self.load_mem('dmem', self.binprog['dmem'])
+        # programs that don't say which memories they write to are assumed to write to all of them
+        mem_writes = self.binprog.get('mem_writes', ['wmem', 'dmem'])
+        for mem_sel in ['wmem', 'dmem']:
+            if self.binprog[mem_sel] is None:
+                continue
+            if not force and mem_sel in self.mem_synced and mem_sel not in mem_writes:
+                continue
+            self.load_mem(mem_sel, self.binprog[mem_sel])
+            self.mem_synced.add(mem_sel)
 
-    def load_bin_program(self, binprog, load_mem):
+    def invalidate_mem(self):
+        """Forget that the memories match the loaded program, so the next reload_mem() writes all of them.
+        """
+        self.mem_synced.clear()
+
+    def load_bin_program(self, binprog, load_mem, force=False):
         """
         Write the program to the tProc program memory.
+        Memories whose contents are the same as in the previous program, and haven't been modified since, are not rewritten.
+
+        :param force: write all memories, even if they should be unchanged
+        :type force: bool
         """
+        prev = self.binprog
         self.binprog = binprog
-        self.load_mem('pmem', self.binprog['pmem'])
+        if force or prev is None:
+            self.invalidate_mem()
+        else:
+            # the previous program may have modified some memories
+            for mem_sel in prev.get('mem_writes', ['wmem', 'dmem']):
+                self.mem_synced.discard(mem_sel)
+            for mem_sel in ['pmem', 'wmem', 'dmem']:
+                if not self._mem_equal(prev[mem_sel], binprog[mem_sel]):
+                    self.mem_synced.discard(mem_sel)
+        if 'pmem' not in self.mem_synced:
+            self.load_mem('pmem', self.binprog['pmem'])
+            self.mem_synced.add('pmem')
         if load_mem: self.reload_mem()
 
+    @staticmethod
+    def _mem_equal(a, b):
+        if a is None or b is None:
+            return a is None and b is None
+        return np.array_equal(a, b)
+
     def print_axi_regs(self):
         print('---------------------------------------------')
         print('--- AXI Registers')
@@ -3,9 +3,13 @@ Support functions.
 """
 from typing import Union, List
 import numpy as np
+import os
 import json
 import base64
+import time
+import itertools
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 def to_int(val, scale, quantize=1, parname=None, trunc=False):
     """Convert a parameter value from user units to ASM units.
@@ -221,6 +225,61 @@ def json2progs(s):
 
     return proglist
 
+def _dump_compiled(prog):
+    # round-trip through JSON, so the result is exactly what json2progs() would give
+    return json.loads(json.dumps(prog.dump_prog(), cls=NpEncoder), object_pairs_hook=OrderedDict)
+
+def _build_prog(factory, kwargs):
+    t_start = time.perf_counter()
+    prog = factory(**kwargs)
+    if prog.binprog is None:
+        prog.compile()
+    elapsed = time.perf_counter() - t_start
+    return _dump_compiled(prog), elapsed
+
+def compile_progs(factory, params, max_workers=None):
+    """Compile many programs in parallel, using a pool of processes.
+
+    Each worker calls the factory (a function or class) with one set of keyword arguments, and sends back the compiled program.
+    The factory and parameters must be picklable: in particular, the factory must be defined at module level (or be a functools.partial of such a function or class).
+    On platforms where worker processes are spawned (macOS, Windows), the calling script must use an ``if __name__ == "__main__":`` guard.
+
+    The results are program dictionaries, as returned by json2progs(), which can be loaded into an empty program with load_prog().
+
+    Parameters
+    ----------
+    factory : callable
+        function that returns a program, e.g. an AveragerProgramV2 subclass or a functools.partial of one
+    params : list of dict, or dict of list
+        keyword arguments for each call to factory;
+        a dict of lists is expanded to all combinations of the listed values (a parameter grid)
+    max_workers : int
+        number of worker processes (default: number of CPUs)
+
+    Returns
+    -------
+    list of dict
+        compiled programs, in the same order as params
+    numpy.ndarray of float
+        compile time for each program (in seconds), measured in the worker
+    """
+    if isinstance(params, dict):
+        keys = list(params.keys())
+        params = [dict(zip(keys, vals)) for vals in itertools.product(*params.values())]
+    jobs = [(factory, kwargs) for kwargs in params]
+    if not jobs:
+        return [], np.zeros(0)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # batch the jobs, so each worker gets a few large messages instead of many small ones
+    chunksize = max(1, len(jobs)//(max_workers*4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_build_prog, *zip(*jobs), chunksize=chunksize))
+    proglist = [r[0] for r in results]
+    times = np.array([r[1] for r in results])
+    return proglist, times
+
 def ch2list(ch: Union[List[int], int]) -> List[int]:
     """
     convert a channel number or a list of ch numbers to list of integers
@@ -4,6 +4,8 @@ Support classes for dealing with FPGA IP blocks.
 from pynq.overlay import DefaultIP
 import numpy as np
 import logging
+import threading
+from contextlib import contextmanager
 from qick import obtain
 
 class DummyIP:
@@ -59,9 +61,26 @@ class SocIP(QickIP, DefaultIP):
     Classes that extend a Xilinx driver will inherit from both this class and the Xilinx class.
     They should inherit from (SocIP, XilinxDriver) in that order.
     This ensures that DefaultIP (which does not support cooperative multiple inheritance) is last in the method resolution order.
+
+    Registers listed in SHADOW_REGS are only ever changed by this driver object, so once they have been written, reads are served from a cache instead of the hardware.
+    Registers that the firmware changes must not be shadowed.
+    Writes made from another process (like the worker of a ProcessDataStreamer, which has its own copy of the driver) don't update this process's cache, so a shadowed register may only be written there if the stale cached value is never relied on.
+    Register writes made inside a reg_transaction() are deferred to the end of the transaction, and consecutive registers are written with a single bulk write.
+    Transactions are per-thread: writes from other threads are not deferred.
     """
 
+    # registers that only this driver object changes, so their values can be cached
+    SHADOW_REGS = []
+
     def __init__(self, description):
+        # cached values of the shadowed registers
+        self._reg_cache = {}
+        # per-thread state for reg_transaction()
+        self._reg_local = threading.local()
+        # number of MMIO read and write operations
+        self.mmio_reads = 0
+        self.mmio_writes = 0
+
         # this block's register map: to be defined in _init_config()
         self.REGISTERS = {}
 
@@ -95,7 +114,18 @@ class SocIP(QickIP, DefaultIP):
         # don't try to index into self.REGISTERS if we're trying to access self.REGISTERS or self.REGISTERS has not yet been initialized
         if a!='REGISTERS' and hasattr(self, 'REGISTERS') and a in self.REGISTERS:
             index = self.REGISTERS[a]
-            self.mmio.array[index] = np.uint32(obtain(v))
+            v = np.uint32(obtain(v))
+            if a in self.SHADOW_REGS:
+                # a Python int, so read-modify-writes with negative masks (like &= ~63) work with any numpy version
+                self._reg_cache[a] = int(v)
+            if self._reg_pending is None:
+                self.mmio.array[index] = v
+                self.mmio_writes += 1
+            else:
+                # a second write to the same register must not be merged with the first
+                if any(i==index for i, _ in self._reg_pending):
+                    self._flush_regs()
+                self._reg_pending.append((index, v))
         else:
             super().__setattr__(a, v)
 
@@ -109,11 +139,85 @@ class SocIP(QickIP, DefaultIP):
         :rtype: *args object
         """
         if a!='REGISTERS' and hasattr(self, 'REGISTERS') and a in self.REGISTERS:
+            if a in self._reg_cache:
+                return self._reg_cache[a]
+            # the read might depend on writes we haven't done yet
+            if self._reg_pending:
+                self._flush_regs()
             index = self.REGISTERS[a]
+            self.mmio_reads += 1
             return self.mmio.array[index]
         else:
             return super().__getattribute__(a)
 
+    @property
+    def _reg_pending(self):
+        """Deferred register writes of the current thread as (index, value), in the order they were made; None if not in a transaction.
+        """
+        return getattr(self._reg_local, 'pending', None)
+
+    @_reg_pending.setter
+    def _reg_pending(self, pending):
+        self._reg_local.pending = pending
+
+    @contextmanager
+    def reg_transaction(self):
+        """Context manager that defers register writes until the end of the block.
+        The writes are done in the order they were made, but runs of writes to consecutive registers are merged into single bulk writes.
+        Transactions can be nested; the writes are done at the end of the outermost transaction.
+        """
+        if self._reg_pending is not None:
+            yield
+            return
+        self._reg_pending = []
+        try:
+            yield
+        finally:
+            self._flush_regs()
+            self._reg_pending = None
+
+    def _flush_regs(self):
+        pending, self._reg_pending = self._reg_pending, []
+        start = 0
+        for i in range(1, len(pending)+1):
+            if i==len(pending) or pending[i][0] != pending[i-1][0]+1:
+                addr = pending[start][0]
+                self.mmio.array[addr:addr+i-start] = [v for _, v in pending[start:i]]
+                self.mmio_writes += 1
+                start = i
+
+    def write_regs(self, regs):
+        """Write several registers in one transaction.
+        Over Pyro, this is also a single remote call.
+
+        :param regs: register names and values, in the order they should be written
+        :type regs: dict
+        """
+        with self.reg_transaction():
+            for k, v in obtain(regs).items():
+                setattr(self, k, v)
+
+    def invalidate_regs(self):
+        """Forget the cached register values, so the next reads come from the hardware.
+        This is needed if the firmware block has been reset.
+        """
+        self._reg_cache.clear()
+
+    def get_mmio_counts(self, reset=False):
+        """Get the number of MMIO read and write operations done by this driver.
+        A bulk write counts as one operation.
+
+        :param reset: zero the counters after reading them
+        :type reset: bool
+        :return: dictionary with "reads" and "writes"
+        :rtype: dict
+        """
+        counts = {'reads': self.mmio_reads, 'writes': self.mmio_writes}
+        if reset:
+            self.mmio_reads = 0
+            self.mmio_writes = 0
+        return counts
+
 class QickMetadata:
     """
     Provides information about the connections between IP blocks, extracted from the HWH file.
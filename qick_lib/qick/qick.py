@@ -3,19 +3,19 @@ The lower-level driver for the QICK library. Contains classes for interfacing wi
 """
 import os
 import mmap
+import copy
 from pynq.overlay import Overlay
 import xrfclk
 import xrfdc
 import numpy as np
 import time
-import queue
 import logging
 from collections import OrderedDict, defaultdict
 from fractions import Fraction
 from . import bitfile_path, obtain, get_version
 from .ip import SocIP, QickMetadata
 from .parser import parse_to_bin
-from .streamer import DataStreamer
+from .streamer import DataStreamer, ProcessDataStreamer
 from .qick_asm import QickConfig
 from .asm_v1 import QickProgram
 from .asm_v2 import QickProgramV2
@@ -794,6 +794,10 @@ class QickSoc(Overlay, QickConfig):
     adc_sample_rates : dict[int, float] or None
         Sample rates to override the values compiled into the firmware.
         This should be a dictionary mapping ADC tiles to sample rates (in megasamples per second).
+    streamer_backend : str
+        "thread" (default) runs the streaming readout in a thread.
+        "process" runs it in a separate process, with data passed through shared memory.
+        This keeps the readout from competing for the GIL with heavy computation in the main process.
     """
 
     # The following constants are no longer used. Some of the values may not match the bitfile.
@@ -815,7 +819,7 @@ class QickSoc(Overlay, QickConfig):
     #gain_resolution_signed_bits = 16
 
     # Constructor.
-    def __init__(self, bitfile=None, download=True, no_tproc=False, no_rf=False, force_init_clks=False, clk_output=None, external_clk=None, dac_sample_rates=None, adc_sample_rates=None, **kwargs):
+    def __init__(self, bitfile=None, download=True, no_tproc=False, no_rf=False, force_init_clks=False, clk_output=None, external_clk=None, dac_sample_rates=None, adc_sample_rates=None, streamer_backend='thread', **kwargs):
         if bitfile is None:
             bitfile = bitfile_path()
 
@@ -846,6 +850,9 @@ class QickSoc(Overlay, QickConfig):
         # list of objects that need to be registered for autoproxying over Pyro
         self.autoproxy = []
 
+        # the settings we last wrote to each generator and readout block, so config_all() can skip unchanged settings
+        self.hw_shadow = {}
+
         # Initialize lists of IP blocks.
         # Signal generators (anything driven by the tProc)
         self.gens = []
@@ -883,7 +890,12 @@ class QickSoc(Overlay, QickConfig):
         self.map_signal_paths(no_tproc)
         if not no_tproc:
             #self.tnet = self.qick_net_0
-            self._streamer = DataStreamer(self)
+            if streamer_backend == 'thread':
+                self._streamer = DataStreamer(self)
+            elif streamer_backend == 'process':
+                self._streamer = ProcessDataStreamer(self)
+            else:
+                raise RuntimeError("invalid streamer_backend: %s" % (streamer_backend))
             self.autoproxy.extend([self.streamer, self.tproc])
 
     @property
@@ -1217,6 +1229,36 @@ class QickSoc(Overlay, QickConfig):
                 x.mode_reg = 1
                 x.update()
 
+        self.invalidate_caches()
+
+    def download(self, *args, **kwargs):
+        """Download the bitstream into the FPGA.
+        This resets the firmware blocks and wipes their memories, so the cached settings and memory contents are invalidated.
+        """
+        Overlay.download(self, *args, **kwargs)
+        self.invalidate_caches()
+
+    def invalidate_caches(self):
+        """Forget the cached generator and readout settings, the cached contents of the generator envelope memories and tProc memories, and the cached register values in the drivers.
+        The next program load will write all of those settings and memories.
+        This is done automatically by pl_reset() and download(); you would only need to call it if you change those settings by some other route.
+        """
+        if hasattr(self, 'hw_shadow'):
+            self.hw_shadow.clear()
+        # download() is called by Overlay.__init__, before the IP blocks are initialized
+        for gen in getattr(self, 'gens', []):
+            if hasattr(gen, 'invalidate_envelopes'):
+                gen.invalidate_envelopes()
+        if getattr(self, 'TPROC_VERSION', None) == 2:
+            self.tproc.invalidate_mem()
+        # a reset may have changed registers that the drivers cache
+        blocks = [getattr(self, name, []) for name in ['gens', 'iqs', 'avg_bufs', 'readouts', 'time_taggers']]
+        if getattr(self, 'TPROC_VERSION', 0):
+            blocks.append([self.tproc])
+        for block in [x for blocklist in blocks for x in blocklist]:
+            if isinstance(block, SocIP):
+                block.invalidate_regs()
+
     def get_sample_rates(self):
         """
         Produce dictionaries of the current sample rates of the DAC and ADC tiles.
@@ -1292,7 +1334,7 @@ class QickSoc(Overlay, QickConfig):
         # request data from DMA
         return self.avg_bufs[ch].transfer_buf(address, length)
 
-    def get_accumulated(self, ch, address=0, length=None):
+    def get_accumulated(self, ch, address=0, length=None, out=None):
         """
         Acquires data from the readout accumulated buffer
 
@@ -1302,6 +1344,8 @@ class QickSoc(Overlay, QickConfig):
         :type address: int
         :param length: Buffer transfer length
         :type length: int
+        :param out: Destination array of shape (length, 2); if given, the data is written into it and it is returned
+        :type out: numpy.ndarray
         :returns:
             - di[:length] (:py:class:`list`) - list of accumulated I data
             - dq[:length] (:py:class:`list`) - list of accumulated Q data
@@ -1312,9 +1356,29 @@ class QickSoc(Overlay, QickConfig):
             length = self.avg_bufs[ch]['avg_maxlen']
 
         # request data from DMA
-        return self.avg_bufs[ch].transfer_avg(address, length)
+        return self.avg_bufs[ch].transfer_avg(address, length, out=out)
+
+    def group_avg_dmas(self, ch_list):
+        """Group readout channels by the DMA that reads out their accumulated buffers.
+        Channels in the same group share a DMA (and switch, if any), so their transfers must not overlap.
+        Transfers for different groups can run at the same time.
+
+        Parameters
+        ----------
+        ch_list : list of int
+            readout channels (indices in 'readouts' list)
+
+        Returns
+        -------
+        list of list of int
+            indices (in ch_list) of the channels in each group, in order of first appearance
+        """
+        groups = OrderedDict()
+        for iCh, ch in enumerate(ch_list):
+            groups.setdefault(id(self.avg_bufs[ch].dma_avg), []).append(iCh)
+        return list(groups.values())
 
-    def configure_readout(self, ch, ro_regs):
+    def configure_readout(self, ch, ro_regs, force=False):
         """Configure readout channel output style and frequency.
         This method is only for use with PYNQ-configured readouts.
 
@@ -1324,9 +1388,26 @@ class QickSoc(Overlay, QickConfig):
             readout channel number (index in 'readouts' list)
         ro_regs : dict
             readout registers, from QickConfig.calc_ro_regs()
+        force : bool
+            force update, even if the settings are the same
         """
+        ro_regs = obtain(ro_regs)
+        if not force and self._shadow_matches(('readout', ch), ro_regs):
+            return
         buf = self.avg_bufs[ch]
         buf.readout.set_all_int(ro_regs)
+        self._update_shadow(('readout', ch), ro_regs)
+
+    def _shadow_matches(self, key, state):
+        """Check whether the given settings are the ones we last wrote to a block.
+        """
+        return key in self.hw_shadow and self.hw_shadow[key] == state
+
+    def _update_shadow(self, key, state):
+        """Record the settings we just wrote to a block.
+        We store a copy, since the caller may modify its copy in place.
+        """
+        self.hw_shadow[key] = copy.deepcopy(state)
 
     def config_avg(
         self, ch, address=0, length=1,
@@ -1396,7 +1477,7 @@ class QickSoc(Overlay, QickConfig):
         data = np.array(data, dtype=np.int16)
         self.avg_bufs[ch].load_weights(data, addr)
 
-    def load_envelope(self, ch, data, addr):
+    def load_envelope(self, ch, data, addr, force=False):
         """Load envelope data into a signal generator.
 
         Parameters
@@ -1407,10 +1488,12 @@ class QickSoc(Overlay, QickConfig):
             Array of (I, Q) values for pulse envelope
         addr: int
             Starting address
+        force: bool
+            load the envelope even if it's already in the generator memory
         """
         # we may have converted to list for pyro compatiblity, so convert back to ndarray
         data = np.array(data, dtype=np.int16)
-        self.gens[ch].load(xin=data, addr=addr)
+        self.gens[ch].load(xin=data, addr=addr, force=force)
 
     def set_nyquist(self, ch, nqz, force=False):
         """
@@ -1420,11 +1503,13 @@ class QickSoc(Overlay, QickConfig):
         :type ch: int
         :param nqz: Nyquist zone
         :type nqz: int
+        :param force: force update, even if the setting is the same
+        :type force: bool
         """
 
-        self.gens[ch].set_nyquist(nqz)
+        self.gens[ch].set_nyquist(nqz, force=force)
 
-    def set_mixer_freq(self, ch, f, ro_ch=None, phase_reset=True):
+    def set_mixer_freq(self, ch, f, ro_ch=None, phase_reset=True, force=False):
         """
         Set mixer frequency for a signal generator.
         If the generator does not have a mixer, you will get an error.
@@ -1440,9 +1525,11 @@ class QickSoc(Overlay, QickConfig):
             use None if you don't want mixer freq to be rounded to a valid readout frequency
         phase_reset : bool
             if this changes the frequency, also reset the phase (so if we go to freq=0, we end up on the real axis)
+        force : bool
+            force update, even if the setting is the same
         """
         if self.gens[ch].HAS_MIXER:
-            self.gens[ch].set_mixer_freq(f, ro_ch, phase_reset=phase_reset)
+            self.gens[ch].set_mixer_freq(f, ro_ch, phase_reset=phase_reset, force=force)
         elif f != 0:
             raise RuntimeError("tried to set a mixer frequency, but this channel doesn't have a mixer")
 
@@ -1521,7 +1608,7 @@ class QickSoc(Overlay, QickConfig):
         """
         for adc in blocknames: self.rf.unfreeze_adc_cal(adc)
 
-    def config_mux_gen(self, ch, tones):
+    def config_mux_gen(self, ch, tones, force=False):
         """Set up a list of tones all at once, using raw (integer) units.
         If the supplied list of tones is shorter than the number supported, the extra tones will have their gains set to 0.
 
@@ -1532,10 +1619,16 @@ class QickSoc(Overlay, QickConfig):
         tones : list of dict
             Tones to configure.
             This is generated by QickConfig.calc_muxgen_regs().
+        force : bool
+            force update, even if the setting is the same
         """
+        tones = obtain(tones)
+        if not force and self._shadow_matches(('mux_gen', ch), tones):
+            return
         self.gens[ch].set_tones_int(tones)
+        self._update_shadow(('mux_gen', ch), tones)
 
-    def config_mux_readout(self, pfbpath, cfgs, sel=None):
+    def config_mux_readout(self, pfbpath, cfgs, sel=None, force=False):
         """Set up a list of readout frequencies all at once, using raw (integer) units.
 
         Parameters
@@ -1547,7 +1640,16 @@ class QickSoc(Overlay, QickConfig):
             This is generated by QickConfig.calc_pfbro_regs().
         sel : str
             Output selection (if supported), default to 'product'
+        force : bool
+            force update, even if the settings are the same
         """
+        cfgs = obtain(cfgs)
+        if not force and self._shadow_matches(('mux_readout', pfbpath), (cfgs, sel)):
+            return
+        self._config_mux_readout(pfbpath, cfgs, sel)
+        self._update_shadow(('mux_readout', pfbpath), (cfgs, sel))
+
+    def _config_mux_readout(self, pfbpath, cfgs, sel):
         pfb = getattr(self, pfbpath)
         if pfb.HAS_OUTSEL:
             if sel is None: sel = 'product'
@@ -1581,8 +1683,9 @@ class QickSoc(Overlay, QickConfig):
         self.iqs[ch].set_mixer_freq(f)
         self.iqs[ch].set_iq(i, q)
 
-    def load_bin_program(self, binprog, load_mem=True):
+    def load_bin_program(self, binprog, load_mem=True, force=False):
         """Write the program to the tProc program memory.
+        For tProc v2, memories whose contents are unchanged from the previous program are not rewritten.
 
         Parameters
         ----------
@@ -1590,6 +1693,8 @@ class QickSoc(Overlay, QickConfig):
             compiled program (format depends on tProc version)
         load_mem : bool
             write waveform and data memory now (can do this later with reload_mem())
+        force : bool
+            write all memories, even if their contents should be unchanged
         """
         binprog = obtain(binprog)
         # cast to ndarray
@@ -1599,13 +1704,22 @@ class QickSoc(Overlay, QickConfig):
             for mem_sel in ['pmem', 'dmem', 'wmem']:
                 if binprog[mem_sel] is not None:
                     binprog[mem_sel] = np.array(binprog[mem_sel], dtype=np.int32)
-        self.tproc.load_bin_program(binprog, load_mem=load_mem)
+        if self.TPROC_VERSION == 2:
+            self.tproc.load_bin_program(binprog, load_mem=load_mem, force=force)
+        else:
+            self.tproc.load_bin_program(binprog, load_mem=load_mem)
 
-    def reload_mem(self):
+    def reload_mem(self, force=False):
         """Reload the waveform and data memory, overwriting any changes made by running the program.
+        Memories that the program doesn't write to, and that haven't been overwritten since they were last loaded, are skipped.
+
+        Parameters
+        ----------
+        force : bool
+            reload all memories, even if they should be unchanged
         """
         if self.TPROC_VERSION == 2:
-            self.tproc.reload_mem()
+            self.tproc.reload_mem(force=force)
 
     def load_mem(self, data, mem_sel='dmem', addr=0):
         """
@@ -1765,10 +1879,14 @@ class QickSoc(Overlay, QickConfig):
         # this should always run with internal trigger
         prog.run(self, start_src="internal")
 
-    def start_readout(self, total_shots, counter_addr=1, ch_list=None, reads_per_shot=1, stride=None):
+    def start_readout(self, total_shots, counter_addr=1, ch_list=None, reads_per_shot=1, stride=None, out_bufs=None):
         """
         Start a streaming readout of the accumulated buffers.
 
+        If destination arrays are supplied with out_bufs, the streamer writes each chunk of data directly into its final position in those arrays.
+        The data packets returned by poll_data() then hold the index of the first shot in the chunk, instead of the data itself.
+        This is only useful if the caller shares memory with the QickSoc (i.e. not over Pyro).
+
         :param total_shots: Final value expected for the shot counter
         :type total_shots: int
         :param counter_addr: Data memory address for the shot counter
@@ -1777,14 +1895,23 @@ class QickSoc(Overlay, QickConfig):
         :type ch_list: list of int
         :param reads_per_shot: Number of data points to expect per counter increment
         :type reads_per_shot: list of int
-        :param stride: Default number of measurements to transfer at a time.
+        :param stride: Number of measurements to transfer at a time; None to let the streamer choose and adapt it to the shot rate.
         :type stride: int
+        :param out_bufs: Destination arrays, one per readout channel, each C-contiguous with at least total_shots*reads_per_shot I/Q pairs
+        :type out_bufs: list of numpy.ndarray
         """
         ch_list = obtain(ch_list)
         reads_per_shot = obtain(reads_per_shot)
         if ch_list is None: ch_list = [0, 1]
         if isinstance(reads_per_shot, int):
             reads_per_shot = [reads_per_shot]*len(ch_list)
+        if out_bufs is not None:
+            if len(out_bufs) != len(ch_list):
+                raise RuntimeError("got %d destination arrays for %d readout channels" % (len(out_bufs), len(ch_list)))
+            for buf, nreads in zip(out_bufs, reads_per_shot):
+                # reshape() must give us a view, not a copy
+                if not buf.flags['C_CONTIGUOUS'] or buf.shape[-1] != 2 or buf.size < 2*total_shots*nreads:
+                    raise RuntimeError("destination arrays must be C-contiguous, have a last dimension of 2, and hold %d I/Q pairs" % (total_shots*nreads))
         streamer = self.streamer
 
         if not streamer.readout_worker.is_alive():
@@ -1795,29 +1922,28 @@ class QickSoc(Overlay, QickConfig):
         # if there's still a readout job running, stop it
         if streamer.readout_running():
             print("cleaning up previous readout: stopping tProc and streamer loop")
-            # stop the tProc
-            self.stop_tproc()
-            # tell the readout to stop (this will break the readout loop)
-            streamer.stop_readout()
-            streamer.done_flag.wait()
-            # push a dummy packet into the data queue to halt any running poll_data(), and wait long enough for the packet to be read out
-            streamer.data_queue.put((0, None))
-            time.sleep(0.1)
+            self.stop_readout()
             print("streamer stopped")
         streamer.stop_flag.clear()
 
-        if streamer.data_available():
-            # flush all the data in the streamer buffer
-            print("clearing streamer buffer")
-            # read until the queue times out, discard the data
-            self.poll_data(totaltime=-1, timeout=0.1)
-            print("buffer cleared")
+        # any data left over from a previous readout is dropped by poll_data(), since it belongs to an earlier generation
+        streamer.submit_job(total_shots, counter_addr, ch_list, reads_per_shot, stride, out_bufs)
 
-        streamer.total_count = total_shots
-        streamer.count = 0
-
-        streamer.done_flag.clear()
-        streamer.job_queue.put((total_shots, counter_addr, ch_list, reads_per_shot, stride))
+    def stop_readout(self):
+        """
+        Stop the tProc and any streaming readout in progress, and interrupt any running poll_data().
+        The streamed data that has not been read is marked as stale, and will be dropped.
+        This returns as soon as the readout loop has finished its current transfer.
+        """
+        streamer = self.streamer
+        # stop the tProc
+        self.stop_tproc()
+        if streamer.readout_running():
+            # tell the readout to stop (this will break the readout loop)
+            streamer.stop_readout()
+            streamer.done_flag.wait()
+        # halt any running poll_data(); it returns as soon as it sees the new generation
+        streamer.interrupt_poll()
 
     def poll_data(self, totaltime=0.1, timeout=None):
         """
@@ -1832,28 +1958,10 @@ class QickSoc(Overlay, QickConfig):
         :type totaltime: float
         :param timeout: How long to wait for the next data packet (None = wait forever)
         :type timeout: float
-        :return: list of (data, stats) pairs, oldest first
+        :return: list of (length, (data, stats)) packets, oldest first; if the readout was started with out_bufs, data is the index of the first shot in the packet
         :rtype: list
         """
-        streamer = self.streamer
-
-        time_end = time.time() + totaltime
-        new_data = []
-        while (totaltime < 0) or (streamer.count < streamer.total_count and time.time() < time_end):
-            try:
-                raise RuntimeError("exception in readout loop") from streamer.error_queue.get(block=False)
-            except queue.Empty:
-                pass
-            try:
-                length, data = streamer.data_queue.get(block=True, timeout=timeout)
-                # if we stopped the readout while we were waiting for data, break out and return
-                if streamer.stop_flag.is_set() or data is None:
-                    break
-                streamer.count += length
-                new_data.append((length, data))
-            except queue.Empty:
-                break
-        return new_data
+        return self.streamer.poll_data(totaltime=totaltime, timeout=timeout)
 
     def prepare_round(self):
         """This runs before a program starts running.
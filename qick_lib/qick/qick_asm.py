@@ -4,17 +4,26 @@ This contains tools for managing the board configuration and the base class for
 The assembly language for QICK programs is defined separately for the v1 and v2 tProcessors.
 """
 import logging
+import os
+import time
+import uuid
+import asyncio
+import threading
 import numpy as np
 import json
-from collections import namedtuple, OrderedDict, defaultdict
+from collections import namedtuple, OrderedDict, defaultdict, deque
 import operator
 import functools
 from numbers import Number
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from tqdm.auto import tqdm
 
 from qick import obtain, get_version
 from .helpers import to_int, cosine, gauss, triang, DRAG, decode_array, nqz, nyquist_image
+from .streamer import CounterPoller
+from .telemetry import AcquireTelemetry
+from .compile_cache import code_digest
 
 logger = logging.getLogger(__name__)
 
@@ -992,6 +1001,12 @@ class AbsQickProgram(ABC):
     # if true, downconversion frequencies are sign-flipped, so they are subtracted from the signal instead of added
     FLIP_DOWNCONVERSION = False
 
+    # on-disk cache of compiled programs (a CompileCache), or None to always compile
+    # enable with e.g. AbsQickProgram.compile_cache = CompileCache()
+    compile_cache = None
+    # firmware config entries that compilation depends on
+    COMPILE_CFG_KEYS = ['gens', 'readouts', 'tprocs', 'time_taggers', 'ddr4_buf', 'mr_buf']
+
     def __init__(self, soccfg):
         """
         Constructor method
@@ -1056,6 +1071,47 @@ class AbsQickProgram(ABC):
         """
         ...
 
+    def _cache_refs(self):
+        """Objects that compilation results may refer to, but that should not be stored in the compile cache.
+        """
+        return {'prog': self, 'soccfg': self.soccfg, 'tproccfg': self.tproccfg}
+
+    def _cache_code_classes(self):
+        """Classes whose code compilation depends on, see compile_cache.code_digest().
+        """
+        return type(self).__mro__
+
+    def _compile_cached(self, compile_fn, inputs, outputs):
+        """Run a compilation step, or if compile_cache is enabled and has a matching entry, restore its results from the cache.
+
+        Parameters
+        ----------
+        compile_fn : callable
+            the compilation step
+        inputs : list of str
+            names of the attributes that the compilation depends on
+        outputs : list of str
+            names of the attributes that the compilation sets or modifies
+        """
+        cache = self.compile_cache
+        key = None
+        if cache is not None:
+            refs = self._cache_refs()
+            cfg = self.soccfg.get_cfg()
+            key = cache.make_key({k: getattr(self, k) for k in inputs}, refs,
+                                 plain=(type(self).__module__, type(self).__qualname__,
+                                        code_digest(self._cache_code_classes()),
+                                        {k: cfg.get(k) for k in self.COMPILE_CFG_KEYS}))
+        if key is not None:
+            cached = cache.get(key, refs)
+            if cached is not None:
+                for k, v in cached.items():
+                    setattr(self, k, v)
+                return
+        compile_fn()
+        if key is not None:
+            cache.put(key, {k: getattr(self, k) for k in outputs}, refs)
+
     def dump_prog(self):
         """
         Dump the program to a dictionary.
@@ -1085,18 +1141,23 @@ class AbsQickProgram(ABC):
             for name, env in envdict['envs'].items():
                 env['data'] = decode_array(env['data'])
 
-    def config_all(self, soc, load_envelopes=True, reset=False, load_mem=True):
+    def config_all(self, soc, load_envelopes=True, reset=False, load_mem=True, force=False):
         """
         Load the waveform memory, gens, ROs, and program memory as specified for this program.
         The decimated+accumulated buffers are not configured, since those should be re-configured for each acquisition.
         The tProc is set to internal start before any other configuration is done, to prevent spurious external starts.
 
+        The QickSoc remembers the settings it last applied, and settings that are unchanged from the previous program are not rewritten.
+
         Parameters
         ----------
         reset : bool
             Force-stop the tProc before loading the program.
             This option only affects tProc v1, where the reset takes several ms.
             For tProc v2, where reset is easy, we always do the reset.
+        force : bool
+            Write all settings and memories, even if the QickSoc thinks they are unchanged.
+            Use this if you have changed the hardware configuration by some route other than the QickSoc methods.
         """
         # compile() first, because envelopes might be declared in a make_program() inside _make_asm()
         if self.binprog is None:
@@ -1110,16 +1171,16 @@ class AbsQickProgram(ABC):
 
         # Load the pulses from the program into the soc
         if load_envelopes:
-            self.load_envelopes(soc)
+            self.load_envelopes(soc, force=force)
 
         # Configure signal generators
-        self.config_gens(soc)
+        self.config_gens(soc, force=force)
 
         # Configure the readout down converters
-        self.config_readouts(soc)
+        self.config_readouts(soc, force=force)
 
         # Load the program into the tProc
-        soc.load_bin_program(self.binprog, load_mem=load_mem)
+        soc.load_bin_program(self.binprog, load_mem=load_mem, force=force)
 
     def run(self, soc, load_prog=True, load_envelopes=True, start_src="internal"):
         """Load the program into the tProcessor and start it.
@@ -1225,7 +1286,7 @@ class AbsQickProgram(ABC):
                 raise RuntimeError("readout %d was declared with weights, but this channel doesn't have a weighted buffer"%(ch))
         self.ro_chs[ch] = cfg
 
-    def config_readouts(self, soc):
+    def config_readouts(self, soc, force=False):
         """Configure the readout channels specified in this program.
         This is usually called as part of an acquire() method.
 
@@ -1233,6 +1294,8 @@ class AbsQickProgram(ABC):
         ----------
         soc : QickSoc
             the QickSoc that will execute this program
+        force : bool
+            write the settings even if they are unchanged from the last ones written
         """
         # because readout freqs need to account for mixer freqs, we can only compute freq registers here, after we know all gens have been declared
         # store PFB parameters in PFB list so we can check for collisions and configure the PFB
@@ -1255,14 +1318,14 @@ class AbsQickProgram(ABC):
                     pfbs[pfbname].append(ro_regs)
                 else:
                     # if this is a standard readout, save the settings and write them to the readout
-                    soc.configure_readout(ch, cfg['ro_config'])
+                    soc.configure_readout(ch, cfg['ro_config'], force=force)
         # write the mux settings
         for pfbpath, pfb_regs in pfbs.items():
             sels = [x.get('sel') for x in pfb_regs]
             # all sels should be the same (if has_outsel=False, get() will return None)
             if len(set(sels)) != 1:
                 raise RuntimeError("all declared readouts on a muxed readout must have the same 'sel' setting, you have %s" % (sels))
-            soc.config_mux_readout(pfbpath, pfb_regs, sels[0])
+            soc.config_mux_readout(pfbpath, pfb_regs, sels[0], force=force)
 
     def config_bufs(self, soc, enable_avg=True, enable_buf=True):
         """Configure the readout buffers specified in this program.
@@ -1351,7 +1414,7 @@ class AbsQickProgram(ABC):
 
         self.gen_chs[ch] = cfg
 
-    def config_gens(self, soc):
+    def config_gens(self, soc, force=False):
         """Configure the signal generators specified in this program.
         This is usually called as part of an acquire() method.
 
@@ -1359,14 +1422,16 @@ class AbsQickProgram(ABC):
         ----------
         soc : QickSoc
             the QickSoc that will execute this program
+        force : bool
+            write the settings even if they are unchanged from the last ones written
 
         """
         for ch, cfg in self.gen_chs.items():
-            soc.set_nyquist(ch, cfg['nqz'])
+            soc.set_nyquist(ch, cfg['nqz'], force=force)
             if 'mixer_freq' in cfg:
-                soc.set_mixer_freq(ch, cfg['mixer_freq']['setval'])
+                soc.set_mixer_freq(ch, cfg['mixer_freq']['setval'], force=force)
             if 'mux_tones' in cfg:
-                soc.config_mux_gen(ch, cfg['mux_tones'])
+                soc.config_mux_gen(ch, cfg['mux_tones'], force=force)
 
     def add_envelope(self, ch, name, idata=None, qdata=None):
         """Adds a waveform to the list of envelope waveforms available for this channel.
@@ -1591,7 +1656,7 @@ class AbsQickProgram(ABC):
 
         self.add_envelope(ch, name, idata=triang(length=lenreg, maxv=maxv))
 
-    def load_envelopes(self, soc):
+    def load_envelopes(self, soc, force=False):
         """Loads envelopes that were added using add_envelope into the SoC's signal generator memories.
         Also load weight arrays for weighted buffers.
 
@@ -1599,6 +1664,8 @@ class AbsQickProgram(ABC):
         ----------
         soc : QickSoc
             Qick object
+        force : bool
+            load envelopes even if they are already in the generator memory
         """
         # for pyro compatibility, convert numpy arrays to Python lists
         for iCh, pulses in enumerate(self.envelopes):
@@ -1607,7 +1674,8 @@ class AbsQickProgram(ABC):
                 assert data.dtype==np.int16
                 soc.load_envelope(iCh,
                         data=data.tolist(),
-                        addr=pulse['addr'])
+                        addr=pulse['addr'],
+                        force=force)
 
         for ch, cfg in self.ro_chs.items():
             ro_cfg = self.soccfg['readouts'][ch]
@@ -1708,10 +1776,339 @@ class AbsQickProgram(ABC):
             return None
         return max(timestamps)
 
+class RoundAccumulator:
+    """Keeps a running mean and variance over rounds for every point of the processed data, using Welford's algorithm.
+    Memory use does not depend on the number of rounds.
+    """
+    def __init__(self):
+        # number of rounds added
+        self.n = 0
+        # running mean and sum of squared deviations, one array per readout channel
+        self.mean = None
+        self.m2 = None
+
+    def add(self, data):
+        """Add the results of a round.
+
+        Parameters
+        ----------
+        data : list of numpy.ndarray
+            Processed data for one round, one array per readout channel.
+        """
+        self.n += 1
+        if self.mean is None:
+            self.mean = [np.array(d, dtype=np.float64) for d in data]
+            self.m2 = [np.zeros_like(d) for d in self.mean]
+        else:
+            for mean, m2, d in zip(self.mean, self.m2, data):
+                delta = d - mean
+                mean += delta/self.n
+                m2 += delta*(d - mean)
+
+    def std_err(self):
+        """Standard error of the mean, for every point.
+
+        Returns
+        -------
+        list of numpy.ndarray
+            Same dimensions as the mean; None if fewer than two rounds have been added.
+        """
+        if self.n < 2:
+            return None
+        return [np.sqrt(m2/((self.n-1)*self.n)) for m2 in self.m2]
+
+class RoundSum:
+    """Keeps an integer running sum of raw data over rounds.
+    The raw data is converted to floats and processed only once, when the mean is requested.
+    This is only valid for processing that is linear in the raw data (offset subtraction and reshaping).
+    No variance is kept.
+    """
+    def __init__(self, process, rounds):
+        # function to convert the averaged raw data to the output format
+        self.process = process
+        # int32 holds the sum of 2**16 rounds of int16 data without overflow
+        self.dtype = np.int32 if rounds <= 2**16 else np.int64
+        # number of rounds added
+        self.n = 0
+        # running sum, one array per readout channel
+        self.sums = None
+
+    def add(self, data):
+        """Add the raw data of a round.
+
+        Parameters
+        ----------
+        data : list of numpy.ndarray
+            Raw data for one round, one array per readout channel.
+        """
+        self.n += 1
+        if self.sums is None:
+            self.sums = [d.astype(self.dtype) for d in data]
+        else:
+            for total, d in zip(self.sums, data):
+                np.add(total, d, out=total, casting='unsafe')
+
+    @property
+    def mean(self):
+        """Processed mean over rounds.
+        """
+        return self.process([total/self.n for total in self.sums])
+
+    def std_err(self):
+        """Not available: no variance is kept.
+        """
+        return None
+
+class ShotClassifier:
+    """Converts raw accumulated I/Q values to single-shot state assignments.
+
+    The rotation angle, readout window length, IQ offset and thresholds for each readout are folded into a projection vector and a list of thresholds in raw units.
+    This is computed once per acquisition; the projection and shot buffers are allocated on first use and reused from one round to the next.
+    If the inputs vary in size (as with streamed chunks), the buffers are sized for the largest input so far, and smaller inputs use slices of them.
+
+    Each shot is assigned the number of thresholds that its projected value exceeds.
+    With one threshold per readout, this is the usual 0/1 decision; with N-1 thresholds, shots are discriminated into N states.
+    """
+    def __init__(self, weights, thresholds, dtype=np.float32, alloc=None):
+        # (cos, sin) projection for each readout
+        self.weights = weights
+        # sorted thresholds for each readout, in raw accumulated units
+        self.thresholds = thresholds
+        # dtype of the projection and shot buffers
+        self.dtype = dtype
+        # function (name, shape, dtype) that allocates the shot buffers, if not in RAM
+        self.alloc = alloc
+        # flat buffers, sized for the largest input so far
+        self._proj_buf = None
+        self._shots_buf = None
+        self._flags_buf = None
+        # the normalized (thresholds, angles, remove_offset) this was built from, if known
+        self.params = None
+        # views of the buffers, in the shape of the most recent input
+        self.proj = None
+        self.shots = None
+        self.flags = None
+
+    @classmethod
+    def from_readouts(cls, ro_chs, soccfg, threshold, angle, remove_offset, dtype=np.float32, alloc=None):
+        """Build a classifier for a program's readouts.
+
+        Parameters
+        ----------
+        ro_chs : dict
+            The program's readout channels
+        soccfg : QickConfig
+            Firmware config, for the IQ offsets
+        threshold : float, or list of float or list
+            The threshold(s) to apply to the I values after rotation.
+            Length-normalized units (same units as the output of acquire()).
+            If scalar, the same threshold will be applied to all readout channels.
+            A list must have length equal to the number of declared readout channels.
+            An element of the list may itself be a list of thresholds, for multi-state discrimination on that channel.
+        angle : float or list of float
+            The angle to rotate the I/Q values by before applying the threshold.
+            Units of radians.
+            If scalar, the same angle will be applied to all readout channels.
+            A list must have length equal to the number of declared readout channels.
+        remove_offset: bool
+            Subtract the readout's IQ offset, if any.
+        dtype : numpy.dtype
+            Data type for the projected values and shots.
+        alloc : function or None
+            Function (name, shape, dtype) that allocates the shot buffers, e.g. as memory-mapped files.
+            If None, they are allocated in RAM. Scratch buffers are always in RAM.
+
+        Returns
+        -------
+        ShotClassifier
+            The classifier
+        """
+        params = cls._normalize_params(len(ro_chs), threshold, angle, remove_offset)
+        thresholds, angles, remove_offset = params
+
+        weights = []
+        raw_thresholds = []
+        for i_ch, (ro_ch, ro) in enumerate(ro_chs.items()):
+            w = (np.cos(angles[i_ch]), np.sin(angles[i_ch]))
+            # compare the raw projection against the threshold scaled up by the window length, with the projected offset added back
+            shift = soccfg['readouts'][ro_ch]['iq_offset']*(w[0]+w[1]) if remove_offset else 0
+            weights.append(w)
+            raw_thresholds.append(ro['length']*(thresholds[i_ch] + shift))
+        classifier = cls(weights, raw_thresholds, dtype=dtype, alloc=alloc)
+        classifier.params = params
+        return classifier
+
+    @staticmethod
+    def _normalize_params(nch, threshold, angle, remove_offset):
+        """Expand the thresholding parameters to one sorted float64 array of thresholds and one float angle per readout.
+        """
+        # try to convert threshold to list of floats; if that fails, assume it's already a list
+        try:
+            thresholds = [float(threshold)]*nch
+        except TypeError:
+            thresholds = threshold
+        # angle is 0 if not specified
+        if angle is None: angle = 0.0
+        try:
+            angles = [float(angle)]*nch
+        except TypeError:
+            angles = angle
+        if len(thresholds) != nch or len(angles) != nch:
+            raise RuntimeError("threshold and angle lists must have one entry per readout channel (%d)"%(nch))
+        thresholds = [np.sort(np.atleast_1d(t).astype(np.float64)) for t in thresholds]
+        angles = [float(a) for a in angles]
+        return thresholds, angles, bool(remove_offset)
+
+    def matches(self, nch, threshold, angle, remove_offset):
+        """Check whether this classifier was built from the same thresholding parameters (compared by value).
+
+        Parameters
+        ----------
+        nch : int
+            Number of readouts
+        threshold, angle, remove_offset
+            As for from_readouts()
+
+        Returns
+        -------
+        bool
+            True if the parameters are equal to the ones this classifier was built with
+        """
+        if self.params is None:
+            return False
+        thresholds, angles, remove_offset = self._normalize_params(nch, threshold, angle, remove_offset)
+        my_thresholds, my_angles, my_remove_offset = self.params
+        return (remove_offset == my_remove_offset and angles == my_angles
+                and all(np.array_equal(a, b) for a, b in zip(thresholds, my_thresholds)))
+
+    def detach(self):
+        """Give up the current buffers, so later calls to classify() don't overwrite the results of earlier calls.
+        New buffers are allocated in RAM on the next call.
+        """
+        self.alloc = None
+        self._proj_buf = None
+        self._shots_buf = None
+        self._flags_buf = None
+
+    def classify(self, acc_buf):
+        """Assign states to raw I/Q values.
+
+        Parameters
+        ----------
+        acc_buf : list of numpy.ndarray
+            Raw IQ data, one array per readout with I and Q in the last dimension.
+
+        Returns
+        -------
+        list of numpy.ndarray
+            State assignment for each shot, as a float of the classifier's dtype.
+            These are views of the classifier's own buffers and will be overwritten by the next call, unless detach() is called first.
+        """
+        shapes = [buf.shape[:-1] for buf in acc_buf]
+        sizes = [int(np.prod(shape)) for shape in shapes]
+        if self._shots_buf is None or any(n > len(b) for n, b in zip(sizes, self._shots_buf)):
+            if self._shots_buf is not None:
+                sizes = [max(n, len(b)) for n, b in zip(sizes, self._shots_buf)]
+            alloc = self.alloc
+            if alloc is None:
+                alloc = lambda name, shape, dtype: np.empty(shape, dtype=dtype)
+            # the projection and flags are scratch space, so they always stay in RAM
+            self._proj_buf = [np.empty(n, dtype=self.dtype) for n in sizes]
+            self._shots_buf = [alloc("shots_%d"%(i), (n,), self.dtype) for i, n in enumerate(sizes)]
+            self._flags_buf = [np.empty(n, dtype=bool) if len(t)>1 else None for n, t in zip(sizes, self.thresholds)]
+        views = lambda bufs: [None if b is None else b[:int(np.prod(shape))].reshape(shape) for b, shape in zip(bufs, shapes)]
+        self.proj = views(self._proj_buf)
+        self.shots = views(self._shots_buf)
+        self.flags = views(self._flags_buf)
+
+        for buf, (c, s), thresholds, proj, shots, flags in zip(acc_buf, self.weights, self.thresholds, self.proj, self.shots, self.flags):
+            # project onto the rotated I axis, using the shot buffer as scratch space for the Q term
+            np.multiply(buf[..., 0], c, out=proj, casting='unsafe')
+            np.multiply(buf[..., 1], s, out=shots, casting='unsafe')
+            np.add(proj, shots, out=proj)
+            # count the thresholds exceeded
+            np.greater(proj, thresholds[0], out=shots, casting='unsafe')
+            for t in thresholds[1:]:
+                np.greater(proj, t, out=flags)
+                np.add(shots, flags, out=shots)
+        return self.shots
+
+class IQHistogram:
+    """Accumulates a 2D histogram of single-shot I/Q values for each readout, without storing the shots.
+    Values are normalized to the readout window and offset-corrected, so they're in the same units as the output of acquire().
+    Shots that fall outside the bin edges are not counted.
+
+    If a ShotClassifier is supplied, the number of shots assigned to each state is also counted.
+    The shots are classified by calling classify (default: the classifier's own classify()).
+    """
+    def __init__(self, lengths, offsets, bins, classifier=None, classify=None):
+        # normalization for each readout
+        self.lengths = lengths
+        self.offsets = offsets
+        # number of bins (edges set from the first chunk of data), or bin edges for I and Q
+        self.bins = bins
+        self.edges = [None]*len(lengths)
+        self.counts = [None]*len(lengths)
+        self.classifier = classifier
+        self.classify = classify
+        if classify is None and classifier is not None:
+            self.classify = classifier.classify
+        self.state_counts = None
+        if classifier is not None:
+            self.state_counts = [np.zeros(len(t)+1, dtype=np.int64) for t in classifier.thresholds]
+
+    def _auto_edges(self, iq):
+        """Pick square bins covering the given data, with a margin of half the data's span on each side.
+        """
+        lo, hi = iq.min(), iq.max()
+        span = hi - lo
+        if span == 0: span = 1.0
+        edges = np.linspace(lo - span/2, hi + span/2, self.bins + 1)
+        return (edges, edges)
+
+    def add(self, raw):
+        """Add a batch of shots.
+
+        Parameters
+        ----------
+        raw : list of numpy.ndarray
+            Raw accumulated I/Q values for each readout, with I and Q in the last dimension.
+
+        Returns
+        -------
+        list of numpy.ndarray or None
+            The state assignments of the shots, if there is a classifier.
+            These may be overwritten by the next call.
+        """
+        for i, d in enumerate(raw):
+            iq = d.reshape((-1, 2))/self.lengths[i] - self.offsets[i]
+            if self.edges[i] is None:
+                if isinstance(self.bins, Number):
+                    self.edges[i] = self._auto_edges(iq)
+                else:
+                    edges = np.asarray(self.bins, dtype=np.float64)
+                    self.edges[i] = (edges, edges)
+                self.counts[i] = np.zeros((len(self.edges[i][0])-1, len(self.edges[i][1])-1), dtype=np.int64)
+            counts, _, _ = np.histogram2d(iq[:, 0], iq[:, 1], bins=self.edges[i])
+            self.counts[i] += counts.astype(np.int64)
+        if self.classifier is not None:
+            shots = self.classify(raw)
+            for state_counts, ch_shots in zip(self.state_counts, shots):
+                state_counts += np.bincount(ch_shots.ravel().astype(np.intp), minlength=len(state_counts))
+            return shots
+        return None
+
 class AcquireMixin:
     """Adds acquire() and acquire_decimated() methods for acquiring readout data, and run_rounds() for running repeatedly without acquisition.
     Program classes that use this mixin must call setup_acquire() after _init_prog() and before acquire()/acquire_decimated().
+
+    Each of these methods has an asyncio counterpart (acquire_async() etc.).
     """
+    # how long (in seconds) finish_round() waits for streamed data before checking for an abort
+    POLL_TIMEOUT = 0.5
+    # number of streamer stats tuples kept in self.stats (the most recent ones)
+    STATS_MAXLEN = 1000
+
     def __init__(self, *args, **kwargs):
         # pass through any init arguments
         super().__init__(*args, **kwargs)
@@ -1721,17 +2118,48 @@ class AcquireMixin:
 
         # data from all rounds, before averaging over rounds
         self.rounds_buf = None
+        # running mean and variance over rounds
+        self.rounds_acc = None
 
         # measurements from the most recent round
         # raw accumulated data without normalizing to window length or averaging over reps
         self.acc_buf = None
         # shot-by-shot threshold classification
         self.shots = None
+        # precomputed thresholding for the current acquisition
+        self.classifier = None
+        # single-shot histograms, if acquire() was asked for them
+        self.hist = None
+        # number of tProc counter reads in each round
+        self.counter_reads = None
+        # timing and transfer statistics for the current acquisition
+        self.telemetry = None
 
         # parameters for acquire/acquire_decimated/run_rounds
         self.acquire_params = None
         # progress bar
         self.rounds_pbar = None
+        # set to ask a running acquisition to stop
+        self.abort_flag = threading.Event()
+        # worker thread and in-flight processing for pipelined rounds
+        self.round_executor = None
+        self.pending_round = None
+        # second raw data buffer, filled while the first is being processed
+        self.spare_buf = None
+
+    def __getstate__(self):
+        # threads, locks and progress bars can't be pickled, and are meaningless in another process
+        state = self.__dict__.copy()
+        for k in ['abort_flag', 'round_executor', 'pending_round', 'rounds_pbar']:
+            state.pop(k, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rounds_pbar = None
+        self.abort_flag = threading.Event()
+        self.round_executor = None
+        self.pending_round = None
 
     def _init_declarations(self):
         super()._init_declarations()
@@ -1800,6 +2228,7 @@ class AcquireMixin:
     def get_rounds(self):
         """Get the results from each round, before averaging over rounds.
         This can be called after acquire() or acquire_decimated().
+        If the acquisition was run with keep_rounds=False, this returns None.
 
         Returns
         -------
@@ -1809,9 +2238,57 @@ class AcquireMixin:
         """
         return self.rounds_buf
 
+    def get_std_err(self):
+        """Get the standard error of the round-averaged results, for each point.
+        This is computed from the scatter between rounds, so it's only available if there was more than one round.
+        This can be called after acquire() or acquire_decimated(), or between rounds.
+
+        Returns
+        -------
+        list of numpy.ndarray
+            Standard error for each readout channel, or None if fewer than two rounds have been run.
+            Same dimensions as the return value from AcquireMixin.acquire()/acquire_decimated().
+        """
+        if self.rounds_acc is not None:
+            return self.rounds_acc.std_err()
+        if self.rounds_buf is None or len(self.rounds_buf) < 2:
+            return None
+        n = len(self.rounds_buf)
+        return [np.std([round_d[i] for round_d in self.rounds_buf], axis=0, ddof=1)/np.sqrt(n) for i in range(len(self.ro_chs))]
+
+    def get_rounds_completed(self):
+        """Get the number of rounds that were run and averaged.
+        This may be less than the number requested if acquire() or acquire_decimated() stopped early on target_err or time_budget.
+
+        Returns
+        -------
+        int
+            Number of rounds completed.
+        """
+        if self.counter_reads is None:
+            return 0
+        return len(self.counter_reads)
+
+    def _add_round(self, data):
+        """Save the processed results of a round.
+        """
+        if self.rounds_buf is not None:
+            self.rounds_buf.append(data)
+        if self.rounds_acc is not None:
+            self.rounds_acc.add(data)
+
+    def _rounds_mean(self):
+        """Average the saved results over rounds.
+        """
+        if self.rounds_buf is None:
+            return self.rounds_acc.mean
+        return [np.mean([round_d[i] for round_d in self.rounds_buf], axis=0) for i in range(len(self.ro_chs))]
+
     def get_raw(self):
         """Get the raw integer I/Q values (before normalizing to the readout window, averaging across reps, removing the readout offset, or thresholding).
         This can be called after acquire().
+        The arrays are int32 if the readout window is at most 2**16 samples (so the sums can't overflow), and int64 otherwise; the 'acc_dtype' option to acquire() overrides this.
+        Convert int32 arrays before doing arithmetic that could overflow.
 
         Returns
         -------
@@ -1825,6 +2302,9 @@ class AcquireMixin:
         """Get the shot-by-shot threshold decisions.
         This can be called after acquire().
 
+        The shots are float32 by default (set with the 'threshold_dtype' option to acquire()).
+        Each acquisition has its own arrays, which are not overwritten by later acquisitions or calls to _apply_threshold().
+
         Returns
         -------
         list of numpy.ndarray
@@ -1832,6 +2312,46 @@ class AcquireMixin:
         """
         return self.shots
 
+    def get_hist(self):
+        """Get the single-shot I/Q histograms.
+        This can be called after acquire() with hist_bins.
+
+        Returns
+        -------
+        list of (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            Counts (I bins x Q bins), I bin edges and Q bin edges for each readout channel.
+        """
+        if self.hist is None:
+            return None
+        return [(counts, *edges) for counts, edges in zip(self.hist.counts, self.hist.edges)]
+
+    def get_state_counts(self):
+        """Get the number of shots assigned to each state.
+        This can be called after acquire() with hist_bins and threshold.
+
+        Returns
+        -------
+        list of numpy.ndarray
+            Counts for each state, for each readout channel.
+        """
+        if self.hist is None:
+            return None
+        return self.hist.state_counts
+
+    def get_telemetry(self):
+        """Get a summary of the timing and transfer statistics for the most recent acquisition.
+        This can be called during or after acquire()/acquire_decimated()/run_rounds().
+        The live statistics are in self.telemetry (an AcquireTelemetry).
+
+        Returns
+        -------
+        dict
+            Time spent in each phase, totals, and summaries of the histograms of DMA transfer time and size, buffer backlog and streamer queue depth.
+        """
+        if self.telemetry is None:
+            return None
+        return self.telemetry.summary()
+
     def get_time_axis(self, ro_index, length_only=False):
         """Get an array usable as the time axis for plotting decimated data.
 
@@ -1889,7 +2409,7 @@ class AcquireMixin:
         """
         return np.arange(data.shape[0])/self.soccfg['readouts'][ro_ch]['fs']
 
-    def acquire(self, soc, rounds=1, load_envelopes=True, start_src="internal", threshold=None, angle=None, progress=True, remove_offset=True, step_rounds=False, extra_args=None):
+    def acquire(self, soc, rounds=1, load_envelopes=True, start_src="internal", threshold=None, angle=None, progress=True, remove_offset=True, step_rounds=False, extra_args=None, keep_rounds=True, target_err=None, time_budget=None, pipeline=False, raw_dir=None, hist_bins=None):
         """Acquire data using the accumulated readout.
 
         Parameters
@@ -1902,11 +2422,13 @@ class AcquireMixin:
             if True, load pulse envelopes
         start_src: str
             "internal" (tProc starts immediately) or "external" (each round waits for an external trigger)
-        threshold : float or list of float
+        threshold : float, or list of float or list
             The threshold(s) to apply to the I values after rotation.
             Length-normalized units (same units as the output of acquire()).
             If scalar, the same threshold will be applied to all readout channels.
             A list must have length equal to the number of declared readout channels.
+            An element of the list may itself be a list of thresholds, for multi-state discrimination on that channel:
+            each shot is then assigned the number of thresholds it exceeds.
         angle : float or list of float
             The angle to rotate the I/Q values by before applying the threshold.
             Units of radians.
@@ -1922,6 +2444,37 @@ class AcquireMixin:
             You will need to step through and complete the acquisition with prepare_round(), finish_round(), and finish_acquire().
         extra_args: dict or None
             If the data-processing methods have been overriden and need extra arguments, those are supplied here and will be added to acquire_params.
+            Setting 'zero_copy' to False here forces the streamed data to be passed through the data queue, even if the QickSoc is local.
+            'threshold_dtype' sets the precision of the thresholding calculation and of the shots (default numpy.float32).
+            'acc_dtype' sets the integer dtype of the raw data buffers (numpy.int32 or numpy.int64).
+            By default ('auto'), int32 is used for readouts with windows of at most 2**16 samples, which can't overflow it, and int64 for longer windows.
+        keep_rounds: bool
+            Keep the results of every round, for get_rounds().
+            If False, only a running mean and variance are kept, so memory use doesn't grow with the number of rounds.
+            Either way, the per-point standard error is available from get_std_err().
+        target_err: float or None
+            Stop early, before all rounds have been run, once the standard error (see get_std_err()) of every output point is at or below this value.
+            Same units as the output. At least two rounds are always run.
+        time_budget: float or None
+            Stop early once this much time (in seconds) has elapsed since the start of the acquisition.
+            The round in progress is always completed.
+            The number of rounds actually run is available from get_rounds_completed().
+        pipeline: bool
+            Process each round's data on a worker thread, while the next round is prepared and run.
+            This reduces the dead time between rounds, at the cost of a second raw data buffer.
+            With target_err, the decision to stop is made on the rounds processed so far, so one extra round may be run.
+        raw_dir: str or None
+            Directory for memory-mapped files backing the raw data (get_raw()) and single shots (get_shots()), instead of RAM.
+            This allows single-shot data larger than the available memory.
+            Each acquisition's files are named with a unique prefix (saved as acquire_params['raw_prefix']), so earlier data in the same directory is not overwritten.
+            The files are flushed at the end of each round, and are not deleted.
+        hist_bins: int, array-like or None
+            Accumulate a 2D histogram of the single-shot I/Q values for each readout as the data is streamed, instead of storing the shots.
+            Memory use then doesn't depend on the number of shots, and raw data (get_raw()) and shots (get_shots()) are not kept.
+            The averaged data is still computed and returned as usual.
+            Either the number of bins, in which case square bins are chosen to cover the first chunk of streamed data (not the whole first round) with a wide margin, or the bin edges (used for both I and Q).
+            If threshold is also defined, the shots assigned to each state are counted.
+            See get_hist() and get_state_counts().
 
         Returns
         -------
@@ -1929,9 +2482,11 @@ class AcquireMixin:
             averaged IQ values (float)
             divided by the length of the RO window, and averaged over reps and rounds
             if threshold is defined, the I values will be the fraction of points over threshold
+            (with multi-state discrimination, the average state index)
             dimensions for a simple averaging program: (n_ch, n_reads, 2)
             dimensions for a program with multiple expts/steps: (n_ch, n_reads, n_expts, 2)
         """
+        self.abort_flag.clear()
         self.acquire_params = {
                 'type': 'accumulated',
                 'soc': soc,
@@ -1941,6 +2496,17 @@ class AcquireMixin:
                 'hidereps': True,
                 'threshold': threshold,
                 'angle': angle,
+                'threshold_dtype': np.float32,
+                'raw_dir': raw_dir,
+                # timestamp and random suffix, so files from different acquisitions don't collide
+                'raw_prefix': time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:8],
+                'acc_dtype': 'auto',
+                # if the QickSoc is local (not a Pyro proxy), the streamer can write straight into acc_buf
+                'zero_copy': isinstance(soc, QickConfig),
+                'target_err': target_err,
+                'time_budget': time_budget,
+                't_start': time.time(),
+                'pipeline': pipeline,
                 }
         if extra_args is not None:
             self.acquire_params.update(extra_args)
@@ -1948,13 +2514,36 @@ class AcquireMixin:
         if any([x is None for x in [self.counter_addr, self.loop_dims, self.avg_level]]):
             raise RuntimeError("data dimensions need to be defined with setup_acquire() before calling acquire()")
 
+        # precompute the thresholding parameters
+        self.classifier = None
+        if threshold is not None:
+            self.classifier = ShotClassifier.from_readouts(self.ro_chs, self.soccfg,
+                                                           threshold, angle, remove_offset,
+                                                           dtype=self.acquire_params['threshold_dtype'],
+                                                           alloc=self._alloc_raw if raw_dir is not None and hist_bins is None else None)
+
         total_count = functools.reduce(operator.mul, self.loop_dims)
         reads_per_shot = [ro['trigs'] for ro in self.ro_chs.values()]
 
-        self.acc_buf = [np.zeros((*self.loop_dims, nreads, 2), dtype=np.int64) for nreads in reads_per_shot]
+        self.hist = None
+        if hist_bins is not None:
+            # the shots are binned as they arrive, so there's no raw data buffer to write into
+            self.acquire_params['zero_copy'] = False
+            lengths = [1 if ro['edge_counting'] else ro['length'] for ro in self.ro_chs.values()]
+            offsets = [self._ro_offset(ch, ro.get('ro_config')) if remove_offset and not ro['edge_counting'] else 0 for ch, ro in self.ro_chs.items()]
+            self.hist = IQHistogram(lengths, offsets, hist_bins, classifier=self.classifier, classify=self._classify_shots)
+            self.acc_buf = []
+        else:
+            acc_dtypes = [self._acc_dtype(ch, ro, self.acquire_params['acc_dtype']) for ch, ro in self.ro_chs.items()]
+            self.acc_buf = [self._alloc_raw("acc_buf_%d"%(i), (*self.loop_dims, nreads, 2), dtype) for i, (nreads, dtype) in enumerate(zip(reads_per_shot, acc_dtypes))]
         # data from all rounds, averaged over reps but not over rounds
-        self.rounds_buf = []
-        self.stats = []
+        self.rounds_buf = [] if keep_rounds else None
+        # with keep_rounds, the statistics can be computed from rounds_buf when they're needed
+        self.rounds_acc = RoundAccumulator() if not keep_rounds or target_err is not None else None
+        self.stats = deque(maxlen=self.STATS_MAXLEN)
+        self.counter_reads = []
+        self.spare_buf = [self._alloc_raw("spare_buf_%d"%(i), b.shape, b.dtype) for i, b in enumerate(self.acc_buf)] if pipeline and self.hist is None else None
+        self._start_pipeline()
 
         # select which tqdm progress bar to show
         hiderounds = True
@@ -1965,7 +2554,10 @@ class AcquireMixin:
                 self.acquire_params['hidereps'] = False
 
         # load the program - don't load data memory now, we'll do that later
+        self.telemetry = AcquireTelemetry()
+        t_start = time.time()
         self.config_all(soc, load_envelopes=load_envelopes, load_mem=False)
+        self.telemetry.add_time('config', time.time()-t_start)
 
         self.rounds_pbar = tqdm(total=rounds, disable=hiderounds)
         self.prepare_round()
@@ -1984,17 +2576,71 @@ class AcquireMixin:
             d_reps = acc_buf
             return self._average_buf(d_reps, length_norm=True, remove_offset=self.acquire_params['remove_offset'])
         else:
-            d_reps = [np.zeros_like(d) for d in acc_buf]
-            self.shots = self._apply_threshold(acc_buf,
-                                               self.acquire_params['threshold'],
-                                               self.acquire_params['angle'],
-                                               self.acquire_params['remove_offset'])
-            for i, ch_shot in enumerate(self.shots):
-                d_reps[i][...,0] = ch_shot
-            return self._average_buf(d_reps, length_norm=False)
+            self.shots = self._classify_shots(acc_buf)
+            self._flush_raw(self.shots)
+            return self._average_shots(self.shots)
+
+    def _classify_shots(self, acc_buf):
+        """Classify raw I/Q data with the thresholding parameters of the current acquisition.
+        """
+        p = self.acquire_params
+        return self._apply_threshold(acc_buf, p['threshold'], p['angle'], p['remove_offset'])
+
+    def _acc_dtype(self, ch, ro, requested=None):
+        """Choose the dtype of a readout's raw accumulated buffer.
+        The accumulated values are sums of int16 decimated samples over the readout window (or edge counts, which are smaller).
+        int32 can hold these without overflow if the window is at most 2**16 samples.
+
+        Parameters
+        ----------
+        ch : int
+            readout channel (index in 'readouts' list)
+        ro : dict
+            readout config from ro_chs
+        requested : numpy.dtype, str or None
+            dtype requested by the user; if None or 'auto', int32 if safe and int64 otherwise
+
+        Returns
+        -------
+        numpy.dtype
+            int32 or int64
+        """
+        int32_ok = ro['length'] <= 2**16
+        if requested is None or (isinstance(requested, str) and requested == 'auto'):
+            return np.dtype(np.int32) if int32_ok else np.dtype(np.int64)
+        requested = np.dtype(requested)
+        if requested not in [np.dtype(np.int32), np.dtype(np.int64)]:
+            raise RuntimeError("accumulated buffer dtype must be int32 or int64, got %s"%(requested))
+        if requested == np.int32 and not int32_ok:
+            raise RuntimeError("readout %d has a window of %d samples, which could overflow an int32 accumulated buffer; use int64"%(ch, ro['length']))
+        return requested
+
+    def _acc_fits(self, ch, ro, total_count):
+        """Check whether a readout's accumulated data for one round fits in the accumulated buffer.
+        """
+        return ro['trigs']*total_count <= self.soccfg['readouts'][ch]['avg_maxlen']
+
+    def _alloc_raw(self, name, shape, dtype):
+        """Allocate a zeroed buffer for raw or single-shot data.
+        If raw_dir was given to acquire(), this is a memory-mapped file in that directory, named with this acquisition's prefix; otherwise it's in RAM.
+        """
+        raw_dir = self.acquire_params.get('raw_dir')
+        if raw_dir is None:
+            return np.zeros(shape, dtype=dtype)
+        path = os.path.join(raw_dir, "%s_%s.dat"%(self.acquire_params['raw_prefix'], name))
+        if os.path.exists(path):
+            raise RuntimeError("raw data file %s already exists, refusing to overwrite it"%(path))
+        return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+    def _flush_raw(self, bufs):
+        """Write any memory-mapped buffers to disk.
+        """
+        for buf in bufs:
+            if isinstance(buf, np.memmap):
+                buf.flush()
 
     def _summarize_accumulated(self, rounds_buf):
-        return [np.mean([round_d[i] for round_d in self.rounds_buf], axis=0) for i in range(len(self.ro_chs))]
+        return self._rounds_mean()
 
     def _ro_offset(self, ch, chcfg):
         """Computes the IQ offset expected from this readout.
@@ -2038,7 +2684,7 @@ class AcquireMixin:
         avg_d = []
         for i_ch, (ch, ro) in enumerate(self.ro_chs.items()):
             # average over the avg_level
-            avg = d_reps[i_ch].mean(axis=self.avg_level)
+            avg = d_reps[i_ch].mean(axis=self.avg_level, dtype=np.float64)
             if length_norm and not ro['edge_counting']:
                 avg /= ro['length']
                 if remove_offset:
@@ -2048,6 +2694,77 @@ class AcquireMixin:
 
         return avg_d
 
+    def _new_hist_sums(self):
+        """Allocate zeroed running sums over reps for histogram mode: for each readout, an array of (output points, reads, 2).
+        """
+        n_out = functools.reduce(operator.mul, self.loop_dims) // self.loop_dims[self.avg_level]
+        return [np.zeros((n_out, ro['trigs'], 2)) for ro in self.ro_chs.values()]
+
+    def _add_hist_sums(self, sums, first, raw, shots):
+        """Add a chunk of streamed shots to the running sums over reps, in histogram mode.
+        The raw I/Q values are summed, or the state assignments (as I values) if thresholding.
+
+        Parameters
+        ----------
+        sums : list of numpy.ndarray
+            Running sums from _new_hist_sums()
+        first : int
+            Index of the first shot in the chunk
+        raw : list of numpy.ndarray
+            Raw I/Q values for each readout
+        shots : list of numpy.ndarray or None
+            State assignments for each readout, if thresholding
+        """
+        navg = self.loop_dims[self.avg_level]
+        inner = functools.reduce(operator.mul, self.loop_dims[self.avg_level+1:], 1)
+        for i, (ch_sums, ro) in enumerate(zip(sums, self.ro_chs.values())):
+            nreads = ro['trigs']
+            n = raw[i].shape[0]//nreads
+            # output point for each shot: drop the index in the averaging loop
+            idx = np.arange(first, first+n)
+            out = (idx // (inner*navg))*inner + idx % inner
+            lo = out.min()
+            out -= lo
+            nbins = out.max() + 1
+            if shots is None:
+                vals = raw[i].reshape((n, nreads, 2))
+            else:
+                vals = shots[i].reshape((n, nreads, 1))
+            for iread in range(nreads):
+                for iq in range(vals.shape[-1]):
+                    ch_sums[lo:lo+nbins, iread, iq] += np.bincount(out, weights=vals[:, iread, iq], minlength=nbins)
+
+    def _process_hist_sums(self, sums):
+        """Average the running sums from histogram mode over reps, in the same format as _average_buf() or _average_shots().
+        """
+        navg = self.loop_dims[self.avg_level]
+        out_dims = [n for i, n in enumerate(self.loop_dims) if i != self.avg_level]
+        avg_d = []
+        for i, ch_sums in enumerate(sums):
+            avg = (ch_sums/navg).reshape((*out_dims, *ch_sums.shape[1:]))
+            if self.acquire_params['threshold'] is None:
+                avg /= self.hist.lengths[i]
+                avg -= self.hist.offsets[i]
+            # the reads_per_shot axis should be the first one
+            avg_d.append(np.moveaxis(avg, -2, 0))
+        return avg_d
+
+    def _average_shots(self, shots):
+        """Average single-shot data over reps, in the same format as _average_buf().
+        The averaged shots are stored as I values, Q values are zero.
+
+        :param shots: shot data acquired in a round
+        :return: averaged shot data after each round.
+        """
+        avg_d = []
+        for ch_shots in shots:
+            avg = ch_shots.mean(axis=self.avg_level, dtype=np.float64)
+            iq = np.zeros(avg.shape + (2,))
+            iq[..., 0] = avg
+            # the reads_per_shot axis should be the first one
+            avg_d.append(np.moveaxis(iq, -2, 0))
+        return avg_d
+
     def _apply_threshold(self, acc_buf, threshold, angle, remove_offset):
         """
         This method converts the raw I/Q data to single shots according to the threshold and rotation angle
@@ -2075,27 +2792,12 @@ class AcquireMixin:
             Single shot data
 
         """
-        # try to convert threshold to list of floats; if that fails, assume it's already a list
-        try:
-            thresholds = [float(threshold)]*len(self.ro_chs)
-        except TypeError:
-            thresholds = threshold
-        # angle is 0 if not specified
-        if angle is None: angle = 0.0
-        try:
-            angles = [float(angle)]*len(self.ro_chs)
-        except TypeError:
-            angles = angle
-
-        shots = []
-        for i_ch, (ro_ch, ro) in enumerate(self.ro_chs.items()):
-            avg = acc_buf[i_ch]/ro['length']
-            if remove_offset:
-                offset = self.soccfg['readouts'][ro_ch]['iq_offset']
-                avg -= offset
-            rotated = np.inner(avg, [np.cos(angles[i_ch]), np.sin(angles[i_ch])])
-            shots.append(np.heaviside(rotated - thresholds[i_ch], 0))
-        return shots
+        # use the classifier that acquire() precomputed, if it was built for the same parameters
+        if self.classifier is not None and self.classifier.matches(len(self.ro_chs), threshold, angle, remove_offset):
+            classifier = self.classifier
+        else:
+            classifier = ShotClassifier.from_readouts(self.ro_chs, self.soccfg, threshold, angle, remove_offset)
+        return classifier.classify(acc_buf)
 
     def run_rounds(self, soc, rounds=1, load_envelopes=True, start_src="internal", progress=True, step_rounds=False):
         """Run the program and wait until it completes, once or multiple times.
@@ -2117,6 +2819,7 @@ class AcquireMixin:
             Return after setting up and preparing the first round.
             You will need to step through and complete the acquisition with prepare_round(), finish_round(), and finish_acquire().
         """
+        self.abort_flag.clear()
         self.acquire_params = {
                 'type': 'run_rounds',
                 'soc': soc,
@@ -2129,6 +2832,8 @@ class AcquireMixin:
             raise RuntimeError("data dimensions need to be defined with setup_acquire() before calling run_rounds()")
 
         total_count = functools.reduce(operator.mul, self.loop_dims)
+        self.counter_reads = []
+        self._start_pipeline()
 
         # select which tqdm progress bar to show
         hiderounds = True
@@ -2139,7 +2844,10 @@ class AcquireMixin:
                 self.acquire_params['hidereps'] = False
 
         # load the program - don't load data memory now, we'll do that later
+        self.telemetry = AcquireTelemetry()
+        t_start = time.time()
         self.config_all(soc, load_envelopes=load_envelopes, load_mem=False)
+        self.telemetry.add_time('config', time.time()-t_start)
 
         self.rounds_pbar = tqdm(total=rounds, disable=hiderounds)
         self.prepare_round()
@@ -2153,7 +2861,7 @@ class AcquireMixin:
 
         return self.finish_acquire()
 
-    def acquire_decimated(self, soc, rounds=1, load_envelopes=True, start_src="internal", progress=True, remove_offset=True, step_rounds=False, extra_args=None):
+    def acquire_decimated(self, soc, rounds=1, load_envelopes=True, start_src="internal", progress=True, remove_offset=True, step_rounds=False, extra_args=None, keep_rounds=True, target_err=None, time_budget=None, pipeline=False, stream=False):
         """Acquire data using the decimating readout.
 
         Parameters
@@ -2175,6 +2883,26 @@ class AcquireMixin:
             You will need to step through and complete the acquisition with prepare_round(), finish_round(), and finish_acquire().
         extra_args: dict or None
             If the data-processing methods have been overriden and need extra arguments, those are supplied here and will be added to acquire_params.
+            Setting 'read_acc' to False here skips reading the accumulated data for get_raw().
+        keep_rounds: bool
+            Keep the results of every round, for get_rounds().
+            If False, only an integer running sum of the raw data is kept, and the data is converted to floats and offset-corrected once at the end.
+            Memory use then doesn't grow with the number of rounds, but the standard error is not available (unless target_err is set, in which case a running mean and variance are kept).
+        target_err: float or None
+            Stop early, before all rounds have been run, once the standard error (see get_std_err()) of every output point is at or below this value.
+            Same units as the output. At least two rounds are always run.
+        time_budget: float or None
+            Stop early once this much time (in seconds) has elapsed since the start of the acquisition.
+            The round in progress is always completed.
+            The number of rounds actually run is available from get_rounds_completed().
+        pipeline: bool
+            Process each round's data on a worker thread, while the next round is prepared and run.
+            This reduces the dead time between rounds, at the cost of a second raw data buffer.
+            With target_err, the decision to stop is made on the rounds processed so far, so one extra round may be run.
+        stream: bool
+            Read out finished segments of the decimated buffer while the program is running, treating the buffer as a ring.
+            This allows acquisitions longer than the decimated buffer, as long as the readout keeps up with the program.
+            The accumulated data (get_raw()) is only read if it fits in the accumulated buffer; otherwise a warning is logged.
 
         Returns
         -------
@@ -2184,12 +2912,19 @@ class AcquireMixin:
             multi-rep or multi-read: (n_reps*n_reads, length, 2)
             multi-rep and multi-read: (n_reps, n_reads, length, 2)
         """
+        self.abort_flag.clear()
         self.acquire_params = {
                 'type': 'decimated',
                 'soc': soc,
                 'start_src': start_src,
                 'rounds_remaining': rounds,
                 'remove_offset': remove_offset,
+                'target_err': target_err,
+                'time_budget': time_budget,
+                't_start': time.time(),
+                'pipeline': pipeline,
+                'stream': stream,
+                'read_acc': True,
                 }
         if extra_args is not None:
             self.acquire_params.update(extra_args)
@@ -2202,13 +2937,32 @@ class AcquireMixin:
         # check that the data will fit in the buffers
         for ch, ro in self.ro_chs.items():
             maxlen = self.soccfg['readouts'][ch]['buf_maxlen']
-            if ro['length']*ro['trigs']*total_count > maxlen:
-                raise RuntimeError("Warning: requested readout length (%d x %d trigs x %d reps) exceeds buffer size (%d)"%(ro['length'], ro['trigs'], total_count, maxlen))
-
-        self.rounds_buf = []
+            if stream:
+                # we read in chunks of at most half the buffer, and each chunk must hold at least one shot
+                if ro['length']*ro['trigs'] > maxlen//2:
+                    raise RuntimeError("requested readout length (%d x %d trigs) exceeds half the buffer size (%d), can't stream"%(ro['length'], ro['trigs'], maxlen))
+                if self.acquire_params['read_acc'] and not self._acc_fits(ch, ro, total_count):
+                    logger.warning("readout %d: accumulated data (%d trigs x %d reps) exceeds the accumulated buffer size (%d), it will not be read and get_raw() will not include this readout"%(ch, ro['trigs'], total_count, self.soccfg['readouts'][ch]['avg_maxlen']))
+            elif ro['length']*ro['trigs']*total_count > maxlen:
+                raise RuntimeError("Warning: requested readout length (%d x %d trigs x %d reps) exceeds buffer size (%d), consider stream=True"%(ro['length'], ro['trigs'], total_count, maxlen))
+
+        self.rounds_buf = [] if keep_rounds else None
+        if target_err is not None:
+            self.rounds_acc = RoundAccumulator()
+        elif keep_rounds:
+            # the statistics can be computed from rounds_buf when they're needed
+            self.rounds_acc = None
+        else:
+            # average the raw data, and process it once at the end
+            self.rounds_acc = RoundSum(self._process_decimated, rounds)
+        self.counter_reads = []
+        self._start_pipeline()
 
         # load the program - don't load data memory now, we'll do that later
+        self.telemetry = AcquireTelemetry()
+        t_start = time.time()
         self.config_all(soc, load_envelopes=load_envelopes, load_mem=False)
+        self.telemetry.add_time('config', time.time()-t_start)
 
         self.rounds_pbar = tqdm(total=rounds, disable=not progress)
         self.prepare_round()
@@ -2247,7 +3001,7 @@ class AcquireMixin:
     def _summarize_decimated(self, rounds_buf):
         """aggregate the data from all rounds
         """
-        return [np.mean([round_d[i] for round_d in self.rounds_buf], axis=0) for i in range(len(self.ro_chs))]
+        return self._rounds_mean()
 
     def prepare_round(self):
         """Used with the step_rounds argument to acquire()/acquire_decimated()/run_rounds().
@@ -2257,6 +3011,7 @@ class AcquireMixin:
         The first round is prepared for you by acquire()/acquire_decimated()/run_rounds().
         """
         soc = self.acquire_params['soc']
+        t_start = time.time()
 
         if self.acquire_params['type'] == 'decimated':
             # initialize buffers
@@ -2283,6 +3038,7 @@ class AcquireMixin:
         soc.prepare_round()
         # configure tproc for internal/external start
         soc.start_src(self.acquire_params['start_src'])
+        self.telemetry.add_time('prepare', time.time()-t_start)
 
     def finish_round(self):
         """Used with the step_rounds argument to acquire()/acquire_decimated()/run_rounds().
@@ -2297,61 +3053,227 @@ class AcquireMixin:
         soc = self.acquire_params['soc']
         total_count = functools.reduce(operator.mul, self.loop_dims)
         reads_per_shot = [ro['trigs'] for ro in self.ro_chs.values()]
+        t_start = time.time()
 
         # if start_src="external", you must pulse the trigger input once for every round
 
         count = 0
+        poller = CounterPoller(lambda: soc.get_tproc_counter(addr=self.counter_addr))
         if self.acquire_params['type'] == 'decimated':
             # decimated data
             dec_buf = []
 
             soc.start_tproc()
-            while count < total_count:
-                count = soc.get_tproc_counter(addr=self.counter_addr)
+            if self.acquire_params.get('stream'):
+                dec_buf = self._stream_decimated(soc, poller, total_count)
+            else:
+                poller.wait(total_count, self.abort_flag)
+                self._check_abort(soc)
             soc.start_src("internal")
 
             for ii, (ch, ro) in enumerate(self.ro_chs.items()):
-                dec_buf.append(obtain(soc.get_decimated(ch=ch, address=0, length=ro['length']*ro['trigs']*total_count)))
-                self.acc_buf.append(obtain(soc.get_accumulated(ch=ch, address=0, length=ro['trigs']*total_count).reshape((*self.loop_dims, ro['trigs'], 2))))
-            self.rounds_buf.append(self._process_decimated(dec_buf))
+                if not self.acquire_params.get('stream'):
+                    dec_buf.append(obtain(soc.get_decimated(ch=ch, address=0, length=ro['length']*ro['trigs']*total_count)))
+                # when streaming, the accumulated data may not fit in its buffer (acquire_decimated() warns about this)
+                if self.acquire_params['read_acc'] and (not self.acquire_params.get('stream') or self._acc_fits(ch, ro, total_count)):
+                    self.acc_buf.append(obtain(soc.get_accumulated(ch=ch, address=0, length=ro['trigs']*total_count).reshape((*self.loop_dims, ro['trigs'], 2))))
+            if isinstance(self.rounds_acc, RoundSum):
+                # the raw data is summed, and processed after the last round
+                round_data = (lambda x: x, dec_buf)
+            else:
+                round_data = (self._process_decimated, dec_buf)
         elif self.acquire_params['type'] == 'run_rounds':
             soc.start_tproc()
             with tqdm(total=total_count, disable=self.acquire_params['hidereps']) as pbar:
                 while count < total_count:
-                    new_count = soc.get_tproc_counter(addr=self.counter_addr)
+                    # wake up at least once per progress bar refresh
+                    new_count = poller.wait(min(count + max(1, total_count//100), total_count), self.abort_flag)
+                    self._check_abort(soc)
                     pbar.update(new_count-count)
                     count = new_count
             soc.start_src("internal")
+            round_data = None
         else: # accumulated
+            zero_copy = self.acquire_params['zero_copy']
+            hist_sums = self._new_hist_sums() if self.hist is not None else None
             with tqdm(total=total_count, disable=self.acquire_params['hidereps']) as pbar:
                 soc.start_readout(total_count, counter_addr=self.counter_addr,
-                                       ch_list=list(self.ro_chs), reads_per_shot=reads_per_shot)
+                                       ch_list=list(self.ro_chs), reads_per_shot=reads_per_shot,
+                                       out_bufs=self.acc_buf if zero_copy else None)
                 while count<total_count:
-                    new_data = obtain(soc.poll_data())
+                    # wake up periodically to check for an abort
+                    new_data = obtain(soc.poll_data(timeout=self.POLL_TIMEOUT))
+                    self._check_abort(soc)
+                    self.telemetry.add_poll(new_data)
                     for new_points, (d, s) in new_data:
-                        for ii, nreads in enumerate(reads_per_shot):
-                            #print(count, new_points, nreads, d[ii].shape, total_count)
-                            if new_points*nreads != d[ii].shape[0]:
-                                logger.error("data size mismatch: new_points=%d, nreads=%d, data shape %s"%(new_points, nreads, d[ii].shape))
-                            if count+new_points > total_count:
-                                logger.error("got too much data: count=%d, new_points=%d, total_count=%d"%(count, new_points, total_count))
-                            # use reshape to view the acc_buf array in a shape that matches the raw data
-                            self.acc_buf[ii].reshape((-1,2))[count*nreads:(count+new_points)*nreads] = d[ii]
+                        if count+new_points > total_count:
+                            logger.error("got too much data: count=%d, new_points=%d, total_count=%d"%(count, new_points, total_count))
+                        if zero_copy:
+                            # the streamer has already written the data into acc_buf
+                            if d != count:
+                                logger.error("data out of order: expected shot %d, got shot %d"%(count, d))
+                        elif self.hist is not None:
+                            self._add_hist_sums(hist_sums, count, d, self.hist.add(d))
+                        else:
+                            for ii, nreads in enumerate(reads_per_shot):
+                                #print(count, new_points, nreads, d[ii].shape, total_count)
+                                if new_points*nreads != d[ii].shape[0]:
+                                    logger.error("data size mismatch: new_points=%d, nreads=%d, data shape %s"%(new_points, nreads, d[ii].shape))
+                                # use reshape to view the acc_buf array in a shape that matches the raw data
+                                self.acc_buf[ii].reshape((-1,2))[count*nreads:(count+new_points)*nreads] = d[ii]
                         count += new_points
                         self.stats.append(s)
+                        poller.reads += s[7]
                         pbar.update(new_points)
-            self.rounds_buf.append(self._process_accumulated(self.acc_buf))
+            if self.hist is not None:
+                round_data = (self._process_hist_sums, hist_sums)
+            else:
+                self._flush_raw(self.acc_buf)
+                round_data = (self._process_accumulated, self.acc_buf)
 
         # do any post-execution cleanup
         soc.cleanup_round()
 
-        self.rounds_pbar.update()
+        self.counter_reads.append(poller.reads)
+        self.telemetry.add_time('run', time.time()-t_start)
+        self.telemetry.rounds += 1
+
+        # the previous round must be fully processed before we look at the running stats or reuse its buffer
+        self._wait_round()
         self.acquire_params['rounds_remaining'] -= 1
-        done = (self.acquire_params['rounds_remaining'] <= 0)
+        last = self.acquire_params['rounds_remaining'] <= 0
+        swapped = False
+        if round_data is None:
+            self.rounds_pbar.update()
+        elif self.round_executor is not None and not last:
+            process, buf = round_data
+            if self.spare_buf is not None:
+                # the next round will fill the other buffer
+                self.acc_buf, self.spare_buf = self.spare_buf, self.acc_buf
+                swapped = True
+            self.pending_round = self.round_executor.submit(self._complete_round, process, buf)
+        else:
+            self._complete_round(*round_data)
+        # when pipelined, this round may still be processing, so the decision to stop early is made on the previous rounds
+        done = last or self._stop_early()
         if done:
+            self._wait_round()
+            if swapped:
+                # leave this round's raw data in acc_buf, for get_raw()
+                self.acc_buf, self.spare_buf = self.spare_buf, self.acc_buf
+            self._stop_pipeline()
             self.rounds_pbar.close()
         return not done
 
+    def _stream_decimated(self, soc, poller, total_count):
+        """Read the decimated buffers in chunks while the program runs.
+        The buffers are read as rings: shot n of a readout starts at sample n*length*trigs, modulo the buffer size.
+        Each chunk is at most half the buffer, so the readout can run concurrently with the next chunk being written.
+
+        Parameters
+        ----------
+        soc : QickSoc
+            Qick object
+        poller : CounterPoller
+            Poller for the tProc rep counter
+        total_count : int
+            Number of shots to read
+
+        Returns
+        -------
+        list of numpy.ndarray
+            Raw decimated data for each readout channel, same format as get_decimated().
+        """
+        shot_lens = [ro['length']*ro['trigs'] for ro in self.ro_chs.values()]
+        maxlens = [self.soccfg['readouts'][ch]['buf_maxlen'] for ch in self.ro_chs]
+        chunk = min([(maxlen//2)//shot_len for maxlen, shot_len in zip(maxlens, shot_lens)])
+        dec_buf = [np.zeros((shot_len*total_count, 2), dtype=np.int16) for shot_len in shot_lens]
+
+        count = 0
+        while count < total_count:
+            new_count = min(poller.wait(min(count + chunk, total_count), self.abort_flag), count + chunk)
+            self._check_abort(soc)
+            for ii, ch in enumerate(self.ro_chs):
+                first = count*shot_lens[ii]
+                length = (new_count-count)*shot_lens[ii]
+                start = first % maxlens[ii]
+                # split the transfer if it wraps around the end of the buffer
+                length1 = min(length, maxlens[ii] - start)
+                dec_buf[ii][first:first+length1] = obtain(soc.get_decimated(ch=ch, address=start, length=length1))
+                if length1 < length:
+                    dec_buf[ii][first+length1:first+length] = obtain(soc.get_decimated(ch=ch, address=0, length=length-length1))
+            # check that the shots we just read weren't overwritten while we were reading them
+            # (allow for one shot that's been written but not yet counted)
+            latest = poller.read() + 1
+            for ii, ch in enumerate(self.ro_chs):
+                if (min(latest, total_count) - count)*shot_lens[ii] > maxlens[ii]:
+                    raise RuntimeError("decimated buffer overflow on readout %d: the program is producing data faster than it can be read out"%(ch))
+            count = new_count
+        return dec_buf
+
+    def _complete_round(self, process, buf):
+        """Process a round's raw data and add it to the results.
+        In pipelined mode, this runs on the worker thread.
+        """
+        t_start = time.time()
+        self._add_round(process(buf))
+        self.telemetry.add_time('process', time.time()-t_start)
+        self.rounds_pbar.update()
+
+    def _start_pipeline(self):
+        """Start the worker thread for pipelined rounds, if requested.
+        """
+        self._stop_pipeline()
+        if self.acquire_params.get('pipeline'):
+            self.round_executor = ThreadPoolExecutor(max_workers=1)
+
+    def _wait_round(self):
+        """Wait for the processing of the previous round to finish.
+        Any exception raised during processing is re-raised here.
+        """
+        if self.pending_round is not None:
+            pending, self.pending_round = self.pending_round, None
+            pending.result()
+
+    def _stop_pipeline(self):
+        """Wait for any in-flight processing and shut down the worker thread.
+        """
+        if self.round_executor is not None:
+            self.round_executor.shutdown(wait=True)
+            self.round_executor = None
+        self.pending_round = None
+
+    def abort_acquire(self):
+        """Ask a running acquisition to stop.
+        This is safe to call from another thread; the acquisition stops the tProc and the readout, and raises a RuntimeError.
+        """
+        self.abort_flag.set()
+
+    def _check_abort(self, soc):
+        """If an abort was requested, stop the firmware and raise an exception.
+        """
+        if self.abort_flag.is_set():
+            soc.stop_readout()
+            soc.start_src("internal")
+            self._stop_pipeline()
+            self.rounds_pbar.close()
+            raise RuntimeError("acquisition aborted")
+
+    def _stop_early(self):
+        """Check whether the acquisition should end before all requested rounds are run.
+        """
+        time_budget = self.acquire_params.get('time_budget')
+        if time_budget is not None and time.time() - self.acquire_params['t_start'] >= time_budget:
+            logger.info("time budget of %.3f s used up after %d rounds"%(time_budget, self.get_rounds_completed()))
+            return True
+        target_err = self.acquire_params.get('target_err')
+        if target_err is not None:
+            std_err = self.get_std_err()
+            if std_err is not None and all([np.all(e <= target_err) for e in std_err]):
+                logger.info("target error of %g reached after %d rounds"%(target_err, self.get_rounds_completed()))
+                return True
+        return False
+
     def finish_acquire(self):
         """Used with the step_rounds argument to acquire()/acquire_decimated()/run_rounds().
 
@@ -2360,9 +3282,70 @@ class AcquireMixin:
         list of numpy.ndarray
             Data in the same format that would be returned by acquire()/acquire_decimated().
         """
+        self._wait_round()
+        self._stop_pipeline()
+        if self.classifier is not None:
+            # the shots from this acquisition stay in the classifier's buffers; don't let later classification overwrite them
+            self.classifier.detach()
         if self.acquire_params['type'] == 'decimated':
             return self._summarize_decimated(self.rounds_buf)
         elif self.acquire_params['type'] == 'run_rounds':
             pass
         else: # accumulated
             return self._summarize_accumulated(self.rounds_buf)
+
+    async def acquire_async(self, soc, *args, **kwargs):
+        """asyncio version of acquire(), with the same arguments and return value.
+        The blocking work (firmware configuration, waiting on the tProc counter and the streamed data) runs on a worker thread, so the event loop stays responsive.
+        Cancelling the task stops the tProc and the readout, and waits for the worker thread to finish.
+        """
+        return await self._acquire_async(self.acquire, soc, *args, **kwargs)
+
+    async def acquire_decimated_async(self, soc, *args, **kwargs):
+        """asyncio version of acquire_decimated(), with the same arguments and return value.
+        See acquire_async().
+        """
+        return await self._acquire_async(self.acquire_decimated, soc, *args, **kwargs)
+
+    async def run_rounds_async(self, soc, *args, **kwargs):
+        """asyncio version of run_rounds(), with the same arguments.
+        See acquire_async().
+        """
+        return await self._acquire_async(self.run_rounds, soc, *args, **kwargs)
+
+    async def _acquire_async(self, method, soc, *args, **kwargs):
+        """Step through an acquisition, running each step on a worker thread.
+        """
+        kwargs['step_rounds'] = True
+        # all calls to the QickSoc (or Pyro proxy) go through one thread, in order
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = None
+        try:
+            future = executor.submit(method, soc, *args, **kwargs)
+            await asyncio.wrap_future(future)
+            while True:
+                future = executor.submit(self.finish_round)
+                if not await asyncio.wrap_future(future):
+                    break
+                future = executor.submit(self.prepare_round)
+                await asyncio.wrap_future(future)
+            future = executor.submit(self.finish_acquire)
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # the step in progress can't be cancelled, so ask it to stop and wait for it
+            self.abort_acquire()
+            stopped = False
+            if future is not None and not future.done():
+                try:
+                    await asyncio.shield(asyncio.wrap_future(future))
+                except RuntimeError:
+                    stopped = True
+            # if the step wasn't one that checks for aborts, stop the firmware now
+            if not stopped and self.acquire_params is not None and self.rounds_pbar is not None:
+                try:
+                    await asyncio.shield(asyncio.wrap_future(executor.submit(self._check_abort, soc)))
+                except RuntimeError:
+                    pass
+            raise
+        finally:
+            executor.shutdown(wait=False)
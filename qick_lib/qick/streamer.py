@@ -1,5 +1,8 @@
 from threading import Thread, Event
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
 import time
 import numpy as np
 import traceback
@@ -12,8 +15,246 @@ import traceback
 # In the worst case where the tProc is running fast, we should actually be waiting for IO a lot (due to the DMA).
 # So we think it's safe to use threads.
 # However, this is a complicated problem and we may ultimately need to mess around with sys.setswitchinterval() or go back to Process.
-# To use Process instead of Thread, use the following import and change WORKERTYPE.
-#from multiprocessing import Process, Queue, Event
+# If the main process is doing heavy computation (e.g. live analysis in the same interpreter), the thread can fall behind.
+# For that case, ProcessDataStreamer runs the worker in a separate process and passes data through shared memory instead of queues.
+
+class CounterPoller():
+    """
+    Waits for the tProc shot counter to reach a target value, without spinning on the counter.
+
+    Between counter reads, the poller sleeps for most of the time that the measured shot rate predicts it will take to reach the target.
+    Until the counter starts moving, the sleep time backs off exponentially.
+    Sleeps are capped at max_sleep, which bounds the extra latency.
+
+    :param read_counter: Function that returns the current counter value
+    :type read_counter: function
+    :param max_sleep: Longest sleep between counter reads (seconds)
+    :type max_sleep: float
+    """
+    # shortest sleep, used when the counter has just started moving or is about to reach the target
+    MIN_SLEEP = 1e-4
+    # sleep for this fraction of the predicted time, so we don't overshoot the target
+    UNDERSHOOT = 0.8
+    # weight of the newest measurement in the rate average
+    ALPHA = 0.5
+
+    def __init__(self, read_counter, max_sleep=0.005):
+        self.read_counter = read_counter
+        self.max_sleep = max_sleep
+        # number of counter reads issued
+        self.reads = 0
+        # shots per second
+        self.rate = None
+        # most recent change of the counter
+        self.t_last = None
+        self.last = None
+        # sleep time while the counter isn't moving
+        self.idle_sleep = self.MIN_SLEEP
+
+    def read(self):
+        """
+        Read the counter and update the rate estimate.
+
+        :return: counter value
+        :rtype: int
+        """
+        count = self.read_counter()
+        t = time.time()
+        self.reads += 1
+        if self.last is None or count < self.last:
+            # first read, or the counter was reset
+            self.t_last, self.last = t, count
+        elif count > self.last:
+            rate = (count-self.last)/max(t-self.t_last, 1e-9)
+            self.rate = rate if self.rate is None else self.ALPHA*rate + (1-self.ALPHA)*self.rate
+            self.t_last, self.last = t, count
+            self.idle_sleep = self.MIN_SLEEP
+        return count
+
+    def wait(self, target, stop_flag=None):
+        """
+        Read the counter until it reaches the target or the stop flag is set.
+
+        :param target: Counter value to wait for
+        :type target: int
+        :param stop_flag: Event that ends the wait early, if set
+        :type stop_flag: threading.Event
+        :return: the last counter value read
+        :rtype: int
+        """
+        while True:
+            count = self.read()
+            if count >= target or (stop_flag is not None and stop_flag.is_set()):
+                return count
+            if self.rate is None:
+                t_sleep = self.idle_sleep
+                self.idle_sleep = min(2*self.idle_sleep, self.max_sleep)
+            else:
+                t_sleep = self.UNDERSHOOT*(target-count)/self.rate
+            time.sleep(min(max(t_sleep, self.MIN_SLEEP), self.max_sleep))
+
+class StrideController():
+    """
+    Chooses how many new shots the streamer should wait for before each transfer of accumulated data.
+
+    The controller measures the shot rate (from the tProc counter) and the time taken by each transfer, both smoothed with a moving average.
+    Large strides keep the per-transfer overhead low, so the stride is sized to spend a fixed fraction of the time transferring data.
+    The stride is capped so that the unread backlog, including shots that arrive while a transfer is in progress, stays well under the buffer size.
+
+    :param capacity: Number of shots that fit in the smallest accumulated buffer
+    :type capacity: float
+    :param stride: Fixed stride, or None to adapt the stride to the measurements
+    :type stride: int
+    """
+    # the unread backlog should stay under this fraction of the buffer
+    MAX_FILL = 0.5
+    # target fraction of the time spent in transfers
+    DUTY = 0.1
+    # weight of the newest measurement in the moving averages
+    ALPHA = 0.5
+
+    def __init__(self, capacity, stride=None):
+        self.capacity = capacity
+        self.adaptive = stride is None
+        if stride is None:
+            # until we have measurements, take 10% of the smallest buffer
+            stride = int(0.1 * capacity)
+        # stride must always be at least 1
+        self.stride = max(1, stride)
+        # shots per second
+        self.rate = None
+        # seconds per transfer
+        self.latency = None
+
+    def _smooth(self, avg, x):
+        if avg is None:
+            return x
+        return self.ALPHA*x + (1-self.ALPHA)*avg
+
+    def update(self, newshots, t_shots, t_transfer):
+        """
+        Add measurements from a transfer, and choose the stride for the next transfer.
+
+        :param newshots: Number of shots in the transfer
+        :type newshots: int
+        :param t_shots: Time since the previous transfer, over which those shots were taken (seconds)
+        :type t_shots: float
+        :param t_transfer: Time spent in the transfer (seconds)
+        :type t_transfer: float
+        :return: the new stride
+        :rtype: int
+        """
+        if t_shots > 0:
+            self.rate = self._smooth(self.rate, newshots/t_shots)
+        self.latency = self._smooth(self.latency, t_transfer)
+        if self.adaptive and self.rate is not None:
+            # shots that will arrive while a transfer is running
+            inflight = self.rate*self.latency
+            target = inflight/self.DUTY
+            limit = self.MAX_FILL*self.capacity - inflight
+            self.stride = max(1, int(min(target, limit)))
+        return self.stride
+
+class PacketRing():
+    """
+    Single-producer, single-consumer ring of data packets, used to pass data from the worker thread to the main thread.
+
+    The slots are preallocated, and each side only advances its own index, so neither put() nor get_all() takes a lock.
+    (Updating an index is atomic under the GIL.)
+    The consumer takes all the packets that are ready in one call.
+    An exception from the producer is stored in a single attribute, so checking for it costs one attribute read.
+
+    :param capacity: Number of slots; the producer waits if the consumer falls this far behind
+    :type capacity: int
+    """
+
+    # how long the producer sleeps while waiting for space
+    FULL_SLEEP = 1e-3
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.slots = [None]*capacity
+        # total packets written and read; only the producer writes head, only the consumer writes tail
+        self.head = 0
+        self.tail = 0
+        # exception raised by the producer, if any
+        self.error = None
+        # wakes up the consumer
+        self.ready = Event()
+
+    def empty(self):
+        """
+        :return: True if there are no packets waiting
+        :rtype: bool
+        """
+        return self.head == self.tail
+
+    def put(self, packet, stop_flag=None):
+        """
+        Add a packet (producer side).
+
+        :param packet: packet to add
+        :type packet: object
+        :param stop_flag: Event that makes the producer give up waiting for space and drop the packet, if set
+        :type stop_flag: threading.Event
+        """
+        while self.head - self.tail >= self.capacity:
+            if stop_flag is not None and stop_flag.is_set():
+                return
+            time.sleep(self.FULL_SLEEP)
+        self.slots[self.head % self.capacity] = packet
+        self.head += 1
+        self.ready.set()
+
+    def put_error(self, e):
+        """
+        Pass an exception to the consumer (producer side).
+
+        :param e: exception
+        :type e: Exception
+        """
+        self.error = e
+        self.ready.set()
+
+    def wake(self):
+        """
+        Make a waiting get_all() return, even if there are no packets.
+        """
+        self.ready.set()
+
+    def get_all(self, timeout=None):
+        """
+        Take all the packets that are ready, waiting for at least one (consumer side).
+        If an exception was passed by the producer, this raises a RuntimeError caused by it.
+
+        :param timeout: How long to wait for a packet (None = wait forever)
+        :type timeout: float
+        :return: list of packets, oldest first (empty if the timeout expired or we were woken without data)
+        :rtype: list
+        """
+        woken = False
+        while True:
+            if self.error is not None:
+                e, self.error = self.error, None
+                raise RuntimeError("exception in readout loop") from e
+            head = self.head
+            if head > self.tail:
+                packets = []
+                for i in range(self.tail, head):
+                    slot = i % self.capacity
+                    packets.append(self.slots[slot])
+                    self.slots[slot] = None
+                self.tail = head
+                return packets
+            if woken:
+                return []
+            # clear before re-checking, so a put() after the check still wakes us up
+            self.ready.clear()
+            if self.head > self.tail or self.error is not None:
+                continue
+            if not self.ready.wait(timeout):
+                return []
+            woken = True
 
 class DataStreamer():
     """
@@ -23,6 +264,16 @@ class DataStreamer():
 
     We don't lock the QickSoc or the IPs. The user is responsible for not disrupting a readout in progress.
 
+    Each job and each interrupt starts a new generation.
+    Packets are tagged with the generation of the job that produced them, and poll_data() drops packets from earlier generations, so a stopped readout never needs to be drained.
+    A poll_data() returns as soon as the generation changes.
+
+    Each data packet carries a stats tuple: (elapsed time, shot counter, buffer address, new shots, next stride, shot rate, transfer latency, counter reads, transfer time, transfer bytes, backlog).
+    The stride, rate and latency are the state of the StrideController after the transfer.
+    The counter reads are the number of times the tProc counter was read since the previous packet.
+    The transfer time and bytes are for this packet's DMA transfers alone.
+    The backlog is the number of unread shots at the time of the transfer, as a fraction of the smallest accumulated buffer.
+
     :param soc: The QickSoc object.
     :type soc: QickSoc
     """
@@ -39,10 +290,11 @@ class DataStreamer():
         # Initialize flags and queues.
         # Passes run commands from the main thread to the worker thread.
         self.job_queue = Queue()
-        # Passes data from the worker thread to the main thread.
-        self.data_queue = Queue()
-        # Passes exceptions from the worker thread to the main thread.
-        self.error_queue = Queue()
+        # Passes data and exceptions from the worker thread to the main thread.
+        self.data_ring = PacketRing()
+        # Counts jobs and interrupts; packets from older generations are stale.
+        self.generation = 0
+        self.worker_generation = 0
         # The main thread can use this flag to tell the worker thread to stop.
         # The main thread clears the flag when starting readout.
         self.stop_flag = Event()
@@ -78,7 +330,124 @@ class DataStreamer():
         :return: data queue status
         :rtype: bool
         """
-        return not self.data_queue.empty()
+        return not self.data_ring.empty()
+
+    def submit_job(self, total_shots, counter_addr, ch_list, reads_per_count, stride, out_bufs):
+        """
+        Start a readout job. The worker must be idle.
+        Parameters are as for QickSoc.start_readout().
+        """
+        self.total_count = total_shots
+        self.count = 0
+        self._new_generation()
+
+        self.done_flag.clear()
+        self.job_queue.put((total_shots, counter_addr, ch_list, reads_per_count, stride, out_bufs, self.generation))
+
+    def interrupt_poll(self):
+        """
+        Halt any running poll_data(), and mark any data that hasn't been read yet as stale.
+        """
+        self._new_generation()
+
+    def _new_generation(self):
+        """
+        Start a new generation, and wake up any running poll_data() so it sees the change.
+        """
+        self.generation += 1
+        self.data_ring.wake()
+
+    def poll_data(self, totaltime=0.1, timeout=None):
+        """
+        Get as much data as possible from the data queue.
+        See QickSoc.poll_data() for details.
+        """
+        generation = self.generation
+        time_end = time.time() + totaltime
+        new_data = []
+        while (totaltime < 0) or (self.count < self.total_count and time.time() < time_end):
+            packets = self.data_ring.get_all(timeout=timeout)
+            # stop if we were interrupted or timed out, or if we stopped the readout while we were waiting for data
+            if not packets or self.generation != generation or self.stop_flag.is_set():
+                break
+            for packet_generation, length, data in packets:
+                # drop leftovers from an earlier job
+                if packet_generation == generation:
+                    self.count += length
+                    new_data.append((length, data))
+        return new_data
+
+    def _get_job(self):
+        """
+        Wait for a job from the main thread.
+        """
+        *job, self.worker_generation = self.job_queue.get(block=True)
+        return job
+
+    def _end_job(self):
+        """
+        Clean up after a job, whether it completed or not.
+        """
+        pass
+
+    def _reset_start_src(self):
+        """
+        Called by the worker at the end of a job.
+        """
+        # set tproc for internal start so we don't run the program repeatedly (this also clears the internal-start register)
+        self.soc.start_src("internal")
+
+    def _wait_for_space(self, last_shots, newshots):
+        """
+        Wait until the destination can accept a new chunk of data.
+        """
+        pass
+
+    def _send_data(self, newshots, first_shot, acc_buf, stats):
+        """
+        Pass a chunk of data to the main thread.
+        If the data was written directly to the destination arrays, acc_buf is None.
+        """
+        if acc_buf is not None:
+            self.data_ring.put((self.worker_generation, newshots, (acc_buf, stats)), self.stop_flag)
+        else:
+            # the data is already in place, we just say where it starts
+            self.data_ring.put((self.worker_generation, newshots, (first_shot, stats)), self.stop_flag)
+
+    def _send_error(self, e):
+        """
+        Pass an exception to the main thread.
+        """
+        # an error from a job that has already been replaced is of no interest
+        if self.worker_generation == self.generation:
+            self.data_ring.put_error(e)
+
+    def _transfer_group(self, group, ch_list, reads_per_count, last_shots, newshots, acc_buf, out_bufs):
+        """
+        Transfer a chunk of accumulated data for a group of channels, one channel at a time.
+
+        :param group: Indices (in ch_list) of the channels to transfer
+        :type group: list of int
+        :return: Buffer address of the last transfer
+        :rtype: int
+        """
+        for iCh in group:
+            ch = ch_list[iCh]
+            newpoints = newshots*reads_per_count[iCh]
+            avg_maxlen = self.soc['readouts'][ch]['avg_maxlen']
+            addr = last_shots * reads_per_count[iCh] % avg_maxlen
+            if out_bufs is None:
+                acc_buf[iCh] = self.soc.get_accumulated(ch=ch, address=addr, length=newpoints)
+            else:
+                # DMA straight into this chunk's final position in the destination array
+                # if the destination is a ring buffer, the chunk may wrap around the end and need two transfers
+                dest = out_bufs[iCh].reshape((-1,2))
+                first = last_shots * reads_per_count[iCh] % dest.shape[0]
+                n = min(newpoints, dest.shape[0]-first)
+                self.soc.get_accumulated(ch=ch, address=addr, length=n, out=dest[first:first+n])
+                if n < newpoints:
+                    self.soc.get_accumulated(ch=ch, address=(addr+n) % avg_maxlen, length=newpoints-n, out=dest[:newpoints-n])
+        return addr
 
     def _run_readout(self):
         """
@@ -92,27 +461,39 @@ class DataStreamer():
         :type addr: list of int
         :param reads_per_count: Number of data points to expect per counter increment
         :type reads_per_count: list of int
+        :param out_bufs: Destination arrays for each channel, or None to send the data through the queue
+        :type out_bufs: list of numpy.ndarray
         """
+        executor = None
         while True:
             try:
                 # wait for a job
-                total_shots, counter_addr, ch_list, reads_per_count, stride = self.job_queue.get(block=True)
+                total_shots, counter_addr, ch_list, reads_per_count, stride, out_bufs = self._get_job()
                 #print("streamer loop: start", total_count)
 
                 shots = 0
                 last_shots = 0
 
                 # how many shots worth of data to transfer at a time
-                if stride is None:
-                    # how many shots will fit in each buffer?
-                    shots = [self.soc['readouts'][ch]['avg_maxlen']/reads_per_count[i] for i, ch in enumerate(ch_list)]
-                    # take 10% of the smallest buffer, but stride must always be at least 1
-                    stride = max(1, int(0.1 * min(shots)))
                 # bigger stride is more efficient, but the transfer size must never exceed AVG_MAX_LENGTH, so the stride should be set with some safety margin
+                # how many shots will fit in each buffer?
+                capacity = min([self.soc['readouts'][ch]['avg_maxlen']/reads_per_count[i] for i, ch in enumerate(ch_list)])
+                controller = StrideController(capacity, stride)
 
                 stats = []
 
+                poller = CounterPoller(lambda: self.soc.get_tproc_counter(addr=counter_addr))
+                last_reads = 0
+
+                # channels that share a DMA must be transferred one after another, but different DMAs can run at the same time
+                dma_groups = self.soc.group_avg_dmas(ch_list)
+                if len(dma_groups) > 1:
+                    executor = ThreadPoolExecutor(max_workers=len(dma_groups))
+                else:
+                    executor = None
+
                 t_start = time.time()
+                t_last = t_start
 
                 # if the tproc is configured for internal start, this will start the program
                 # for external start, the program will not start until a start pulse is received
@@ -120,45 +501,296 @@ class DataStreamer():
 
                 # Keep streaming data until you get all of it
                 while last_shots < total_shots:
+                    # wait until either you've gotten a full stride of measurements or you've finished (so you don't go crazy trying to download every measurement)
+                    shots = poller.wait(min(last_shots+controller.stride, total_shots), self.stop_flag)
                     if self.stop_flag.is_set():
                         print("streamer loop: got stop flag")
                         break
-                    shots = self.soc.get_tproc_counter(addr=counter_addr)
-                    # wait until either you've gotten a full stride of measurements or you've finished (so you don't go crazy trying to download every measurement)
-                    if shots >= min(last_shots+stride, total_shots):
+                    if shots > last_shots:
+                        t_read = time.time()
                         newshots = shots-last_shots
                         # buffer for each channel
                         acc_buf = [None for nreads in reads_per_count]
 
-                        # for each adc channel get the single shot data and add it to the buffer
                         for iCh, ch in enumerate(ch_list):
                             newpoints = newshots*reads_per_count[iCh]
-                            avg_maxlen = self.soc['readouts'][0]['avg_maxlen']
+                            avg_maxlen = self.soc['readouts'][ch]['avg_maxlen']
                             if newpoints >= avg_maxlen:
                                 raise RuntimeError("Overflowed the averages buffer (%d unread samples >= buffer size %d)."
                                                    % (newpoints, avg_maxlen) +
                                                    "\nYou need to slow down the tProc by increasing relax_delay." +
                                                    "\nIf the TQDM progress bar is enabled, disabling it may help.")
 
-                            addr = last_shots * reads_per_count[iCh] % avg_maxlen
-                            data = self.soc.get_accumulated(ch=ch, address=addr, length=newpoints)
-                            acc_buf[iCh] = data
+                        self._wait_for_space(last_shots, newshots)
 
-                        last_shots += newshots
+                        # for each adc channel get the single shot data and add it to the buffer
+                        # channels behind different DMAs are transferred in parallel
+                        transfer_args = (ch_list, reads_per_count, last_shots, newshots, acc_buf, out_bufs)
+                        if executor is None:
+                            addr = self._transfer_group(dma_groups[0], *transfer_args)
+                        else:
+                            futures = [executor.submit(self._transfer_group, group, *transfer_args) for group in dma_groups]
+                            addr = [f.result() for f in futures][-1]
+
+                        t_done = time.time()
+                        stride = controller.update(newshots, t_read-t_last, t_done-t_read)
+                        t_last = t_read
 
-                        stats = (time.time()-t_start, shots, addr, newshots)
-                        self.data_queue.put((newshots, (acc_buf, stats)))
+                        nbytes = 8*newshots*sum(reads_per_count)
+                        stats = (t_done-t_start, shots, addr, newshots, stride, controller.rate, controller.latency, poller.reads-last_reads,
+                                 t_done-t_read, nbytes, newshots/capacity)
+                        last_reads = poller.reads
+                        self._send_data(newshots, last_shots, acc_buf if out_bufs is None else None, stats)
+
+                        last_shots += newshots
                 #if last_count==total_count: print("streamer loop: normal completion")
 
             except Exception as e:
                 print("streamer loop: got exception")
                 # traceback.print_exc()
                 # pass the exception to the main thread
-                self.error_queue.put(e)
-                # put dummy data in the data queue, to trigger a poll_data read
-                self.data_queue.put((0, (None, None)))
+                self._send_error(e)
             finally:
+                if executor is not None:
+                    executor.shutdown()
+                    executor = None
+                self._end_job()
                 # we should set the done flag regardless of whether we completed readout, used the stop flag, or errored out
                 self.done_flag.set()
-                # set tproc for internal start so we don't run the program repeatedly (this also clears the internal-start register)
-                self.soc.start_src("internal")
+                self._reset_start_src()
+
+class ProcessDataStreamer(DataStreamer):
+    """
+    Variant of DataStreamer that runs the readout loop in a separate process, so it doesn't compete with the main process for the global interpreter lock.
+    Select it with the streamer_backend parameter of QickSoc.
+
+    Data is passed through ring buffers in shared memory (one per readout channel), indexed by shot number.
+    Instead of queue items, the worker and main process exchange sequence counters in shared memory:
+    the worker advances the number of shots written, and poll_data() advances the number of shots read.
+    The worker never overwrites unread data, so if the main process falls far behind, the worker stalls and the firmware buffer eventually overflows.
+
+    The sequence counters and the stats of the latest chunk are only accessed while holding a lock, which also orders the ring contents:
+    data written before the worker advances the written count is visible to poll_data() once it sees the new count.
+
+    The worker process is forked from the main process, and inherits its memory maps of the firmware registers and DMA buffers.
+    Its driver objects are copies, so register values cached by the drivers (see SocIP.SHADOW_REGS) would not be updated in the main process:
+    the worker only starts the tProc and reads its counter, and the main process resets the start source when the job ends.
+    The main process should not use the accumulated-buffer DMAs while a readout is running.
+
+    :param soc: The QickSoc object.
+    :type soc: QickSoc
+    """
+    # ring size, as a multiple of the number of shots that fit in the smallest accumulated buffer
+    RING_FACTOR = 8
+    # indices in the sequence counter array
+    SEQ_WRITTEN = 0
+    SEQ_READ = 1
+    SEQ_ERROR = 2
+    # sleep while waiting for the other side to move a sequence counter (seconds)
+    POLL_SLEEP = 1e-3
+
+    def __init__(self, soc):
+        self.ctx = multiprocessing.get_context('fork')
+        # shared memory for the current job (main process side)
+        self.rings = []
+        self.ring_views = []
+        self.out_bufs = None
+        # shared memory attached by the worker process
+        self.worker_rings = []
+        self.stale_rings = []
+        super().__init__(soc)
+
+    def start_worker(self):
+        # Passes run commands from the main process to the worker process.
+        self.job_queue = self.ctx.Queue()
+        # Passes exceptions from the worker process to the main process. This is only touched if there's an error.
+        self.error_queue = self.ctx.Queue()
+        self.stop_flag = self.ctx.Event()
+        self.done_flag = self.ctx.Event()
+        self.done_flag.set()
+
+        # sequence counters
+        self.seq = np.frombuffer(self.ctx.RawArray('q', 3), dtype=np.int64)
+        # stats tuple for the most recent chunk, with a running total of counter reads
+        self.last_stats = np.frombuffer(self.ctx.RawArray('d', 11), dtype=np.float64)
+        # guards seq and last_stats
+        self.seq_lock = self.ctx.Lock()
+        self.counter_reads = 0
+        # a job was submitted, and the main process hasn't cleaned up after it
+        self.job_active = False
+        # only used in the main process, where poll_data() runs
+        self.generation = 0
+
+        # start the shared-memory resource tracker before forking, so the worker uses the same tracker and doesn't unlink the main process's segments when it exits
+        resource_tracker.ensure_running()
+
+        # daemon=True means the readout process will be killed if the parent is killed
+        self.readout_worker = self.ctx.Process(target=self._run_readout, daemon=True)
+        self.readout_worker.start()
+
+    def data_available(self):
+        with self.seq_lock:
+            return self.seq[self.SEQ_WRITTEN] > self.seq[self.SEQ_READ]
+
+    def _free_rings(self):
+        self.ring_views = []
+        for shm in self.rings:
+            shm.close()
+            shm.unlink()
+        self.rings = []
+
+    def submit_job(self, total_shots, counter_addr, ch_list, reads_per_count, stride, out_bufs):
+        self._free_rings()
+        capacity = min([self.soc['readouts'][ch]['avg_maxlen']/reads_per_count[i] for i, ch in enumerate(ch_list)])
+        self.ring_shots = max(1, min(total_shots, int(self.RING_FACTOR*capacity)))
+        for nreads in reads_per_count:
+            shm = shared_memory.SharedMemory(create=True, size=self.ring_shots*nreads*2*4)
+            self.rings.append(shm)
+            self.ring_views.append(np.ndarray((self.ring_shots*nreads, 2), dtype=np.int32, buffer=shm.buf))
+        self.reads_per_count = reads_per_count
+        self.out_bufs = out_bufs
+
+        # the worker is idle, but may still be publishing the end of the previous job
+        with self.seq_lock:
+            self.seq[:] = 0
+            self.last_stats[:] = 0
+        self.counter_reads = 0
+        self.job_active = True
+        self.total_count = total_shots
+        self.count = 0
+        self._new_generation()
+
+        self.done_flag.clear()
+        rings = (self.ring_shots, [shm.name for shm in self.rings])
+        self.job_queue.put((total_shots, counter_addr, ch_list, reads_per_count, stride, rings))
+
+    def _new_generation(self):
+        # poll_data() checks the generation every POLL_SLEEP, so it doesn't need waking
+        self.generation += 1
+
+    def interrupt_poll(self):
+        super().interrupt_poll()
+        # QickSoc.stop_readout() calls this after the worker has stopped
+        if self.done_flag.is_set():
+            self._finish_job()
+
+    def _finish_job(self):
+        """
+        Clean up after a job in the main process, once it has finished (completed, stopped or errored out).
+        """
+        if self.job_active:
+            self.job_active = False
+            # this is the thread streamer's end-of-job start_src(), done here so the main process's tProc driver sees it
+            self.soc.start_src("internal")
+
+    def _read_rings(self, first, last):
+        """
+        Copy shots [first, last) out of the ring buffers.
+        """
+        result = []
+        for i, (ring, nreads) in enumerate(zip(self.ring_views, self.reads_per_count)):
+            start = first*nreads % ring.shape[0]
+            length = (last-first)*nreads
+            n = min(length, ring.shape[0]-start)
+            if self.out_bufs is not None:
+                out = self.out_bufs[i].reshape((-1,2))[first*nreads:last*nreads]
+            else:
+                out = np.empty((length, 2), dtype=np.int32)
+            out[:n] = ring[start:start+n]
+            out[n:] = ring[:length-n]
+            result.append(out)
+        return result
+
+    def poll_data(self, totaltime=0.1, timeout=None):
+        generation = self.generation
+        time_end = time.time() + totaltime
+        t_timeout = None
+        new_data = []
+        while (totaltime < 0) or (self.count < self.total_count and (time.time() < time_end or not new_data)):
+            with self.seq_lock:
+                error = self.seq[self.SEQ_ERROR]
+                self.seq[self.SEQ_ERROR] = 0
+                written = int(self.seq[self.SEQ_WRITTEN])
+                read = int(self.seq[self.SEQ_READ])
+                t, shots, addr, newshots, stride, rate, latency, reads, t_transfer, nbytes, backlog = self.last_stats
+            if error:
+                self._finish_job()
+                raise RuntimeError("exception in readout loop") from self.error_queue.get()
+            if self.generation != generation or self.stop_flag.is_set():
+                break
+            if written > read:
+                data = self._read_rings(read, written)
+                # free the space in the ring only after we've copied the data out
+                with self.seq_lock:
+                    self.seq[self.SEQ_READ] = written
+                # several transfers may have been merged into this packet, so count the bytes for all of them
+                stats = (float(t), int(shots), int(addr), int(newshots), int(stride), float(rate), float(latency), int(reads)-self.counter_reads,
+                         float(t_transfer), 8*(written-read)*sum(self.reads_per_count), float(backlog))
+                self.counter_reads = int(reads)
+                if self.out_bufs is not None:
+                    data = read
+                self.count += written-read
+                new_data.append((written-read, (data, stats)))
+                t_timeout = None
+                if self.count >= self.total_count:
+                    # everything has been copied out, so the rings can go
+                    self._free_rings()
+                    self._finish_job()
+            else:
+                if timeout is not None:
+                    if t_timeout is None:
+                        t_timeout = time.time() + timeout
+                    elif time.time() > t_timeout:
+                        break
+                time.sleep(self.POLL_SLEEP)
+        return new_data
+
+    def _get_job(self):
+        total_shots, counter_addr, ch_list, reads_per_count, stride, (ring_shots, names) = self.job_queue.get(block=True)
+        # arrays from the previous job may still be referenced, so we close those segments when we can
+        self.stale_rings.extend(self.worker_rings)
+        self.worker_rings = []
+        out_bufs = []
+        for name, nreads in zip(names, reads_per_count):
+            shm = shared_memory.SharedMemory(name=name)
+            self.worker_rings.append(shm)
+            out_bufs.append(np.ndarray((ring_shots*nreads, 2), dtype=np.int32, buffer=shm.buf))
+        self.ring_shots = ring_shots
+        self.worker_reads = 0
+        return total_shots, counter_addr, ch_list, reads_per_count, stride, out_bufs
+
+    def _end_job(self):
+        still_open = []
+        for shm in self.stale_rings:
+            try:
+                shm.close()
+            except BufferError:
+                still_open.append(shm)
+        self.stale_rings = still_open
+
+    def _reset_start_src(self):
+        # done by the main process, in _finish_job()
+        pass
+
+    def _wait_for_space(self, last_shots, newshots):
+        while True:
+            # the lock ensures poll_data() has finished copying out the shots it marked as read
+            with self.seq_lock:
+                read = self.seq[self.SEQ_READ]
+            if last_shots + newshots - read <= self.ring_shots or self.stop_flag.is_set():
+                break
+            time.sleep(self.POLL_SLEEP)
+
+    def _send_data(self, newshots, first_shot, acc_buf, stats):
+        self.worker_reads += stats[7]
+        # the lock ensures poll_data() sees the ring contents and stats that go with the new count
+        with self.seq_lock:
+            self.last_stats[:7] = [np.nan if x is None else x for x in stats[:7]]
+            self.last_stats[7] = self.worker_reads
+            self.last_stats[8:] = stats[8:]
+            self.seq[self.SEQ_WRITTEN] = first_shot + newshots
+
+    def _send_error(self, e):
+        self.error_queue.put(e)
+        with self.seq_lock:
+            self.seq[self.SEQ_ERROR] = 1
@@ -0,0 +1,183 @@
+"""
+Lightweight instrumentation for acquisitions: fixed-size histograms and per-acquisition counters.
+"""
+import time
+from threading import Lock
+import numpy as np
+
+class Histogram():
+    """
+    Counts values into fixed bins, so memory use doesn't depend on the number of values.
+    Values below the first edge or above the last edge are counted in underflow and overflow bins.
+    The exact count, sum, minimum and maximum are also kept.
+
+    :param edges: Bin edges, increasing
+    :type edges: array-like
+    """
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        # counts[0] is the underflow bin, counts[-1] is the overflow bin
+        self.counts = np.zeros(len(self.edges)+1, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def log(cls, lo, hi, per_decade=10):
+        """
+        Histogram with logarithmically spaced bins, for quantities that span orders of magnitude (times, sizes).
+
+        :param lo: Lowest edge
+        :type lo: float
+        :param hi: Highest edge
+        :type hi: float
+        :param per_decade: Number of bins per factor of 10
+        :type per_decade: int
+        :return: the histogram
+        :rtype: Histogram
+        """
+        ndecades = np.log10(hi/lo)
+        return cls(np.logspace(np.log10(lo), np.log10(hi), int(np.ceil(ndecades*per_decade))+1))
+
+    @classmethod
+    def linear(cls, lo, hi, nbins):
+        """
+        Histogram with equally spaced bins.
+
+        :param lo: Lowest edge
+        :type lo: float
+        :param hi: Highest edge
+        :type hi: float
+        :param nbins: Number of bins
+        :type nbins: int
+        :return: the histogram
+        :rtype: Histogram
+        """
+        return cls(np.linspace(lo, hi, nbins+1))
+
+    def add(self, x):
+        """
+        Count a value.
+
+        :param x: value
+        :type x: float
+        """
+        self.counts[np.searchsorted(self.edges, x, side='right')] += 1
+        self.n += 1
+        self.total += x
+        if self.min is None or x < self.min: self.min = x
+        if self.max is None or x > self.max: self.max = x
+
+    def quantile(self, q):
+        """
+        Estimate a quantile, as the upper edge of the bin where it falls (limited by the maximum value).
+
+        :param q: quantile, between 0 and 1
+        :type q: float
+        :return: estimated value, or None if there are no values
+        :rtype: float
+        """
+        if self.n == 0:
+            return None
+        i = np.searchsorted(np.cumsum(self.counts), q*self.n)
+        if i >= len(self.edges):
+            return self.max
+        return min(float(self.edges[i]), self.max)
+
+    def summary(self):
+        """
+        :return: count, mean, min, max and estimated median, 90th and 99th percentiles
+        :rtype: dict
+        """
+        return {'n': self.n,
+                'mean': self.total/self.n if self.n else None,
+                'min': self.min,
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99)}
+
+class AcquireTelemetry():
+    """
+    Collects timing and transfer statistics over one acquisition (all rounds).
+    AcquireMixin fills this in as the acquisition runs, so it can be inspected live; summary() gives a snapshot.
+
+    Time is split into phases: "config" (config_all), "prepare" (prepare_round), "run" (running the program and reading out data), and "process" (averaging, thresholding).
+    Time not spent in any phase (e.g. in user code between rounds) is reported as "idle".
+    With pipelined rounds, processing overlaps with the other phases, so the phases can add up to more than the elapsed time.
+
+    Streamed data is described by the stats tuple of each packet (see DataStreamer).
+    """
+
+    PHASES = ['config', 'prepare', 'run', 'process']
+
+    def __init__(self):
+        self.t_start = time.time()
+        self.phase_times = dict.fromkeys(self.PHASES, 0.0)
+        # processing may run on a worker thread
+        self.lock = Lock()
+        self.rounds = 0
+        # streamed data
+        self.packets = 0
+        self.shots = 0
+        self.bytes = 0
+        self.counter_reads = 0
+        # time for the DMA transfers of one packet (seconds)
+        self.transfer_time = Histogram.log(1e-6, 10)
+        # size of one packet (bytes)
+        self.transfer_bytes = Histogram.log(8, 1e10, per_decade=5)
+        # unread shots at transfer time, as a fraction of the accumulated buffer; data is lost at 1
+        self.backlog = Histogram.linear(0, 1, 20)
+        # number of packets waiting in the streamer queue, for each poll
+        self.queue_depth = Histogram.linear(0, 64, 64)
+
+    def add_time(self, phase, t):
+        """
+        Add time to a phase.
+
+        :param phase: phase name
+        :type phase: str
+        :param t: time (seconds)
+        :type t: float
+        """
+        with self.lock:
+            self.phase_times[phase] += t
+
+    def add_poll(self, packets):
+        """
+        Record a poll of the streamer, and the stats of the packets it returned.
+
+        :param packets: list of (length, (data, stats)) packets, as returned by poll_data()
+        :type packets: list
+        """
+        self.queue_depth.add(len(packets))
+        for length, (data, stats) in packets:
+            self.packets += 1
+            self.shots += length
+            self.counter_reads += stats[7]
+            self.transfer_time.add(stats[8])
+            self.transfer_bytes.add(stats[9])
+            self.bytes += stats[9]
+            self.backlog.add(stats[10])
+
+    def summary(self):
+        """
+        :return: totals, phase times and histogram summaries
+        :rtype: dict
+        """
+        elapsed = time.time() - self.t_start
+        with self.lock:
+            phases = dict(self.phase_times)
+        phases['idle'] = max(0.0, elapsed - sum(phases.values()))
+        return {'elapsed': elapsed,
+                'phases': phases,
+                'rounds': self.rounds,
+                'packets': self.packets,
+                'shots': self.shots,
+                'bytes': self.bytes,
+                'counter_reads': self.counter_reads,
+                'transfer_time': self.transfer_time.summary(),
+                'transfer_bytes': self.transfer_bytes.summary(),
+                'backlog': self.backlog.summary(),
+                'queue_depth': self.queue_depth.summary()}
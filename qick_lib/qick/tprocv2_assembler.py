@@ -9,6 +9,7 @@
 Description: Assembler for Qick Processor
 -Create Binary Files  ( list2bin, file_asm2bin, str_asm2bin )
 -Create Instruction List ( file_asm2list, str_asm2list )
+  these use the table-driven parse_list(), get_list() is the reference parser (see benchmarks/tprocv2_asm_parse.py)
 -Create Assembler File from Instruction List ( list2asm )
 
 p_list        = Assembler.file_asm2list(filenames[0])
@@ -228,6 +229,7 @@ regex = {
 
 import re
 import copy
+import functools
 import logging
 
 logger = logging.getLogger(__name__)
@@ -268,6 +270,7 @@ def parse_labels(program_list : list, label_dict : dict) -> None:
             else:
                 raise RuntimeError('unrecognized label %s (should be a defined label, or PREV/HERE/NEXT/SKIP'%(command['LABEL']))
 
+@functools.lru_cache(maxsize=4096)
 def integer2bin(strin : str, bits : int = 8, uint : int = 0) -> str:
     """
         receives an integer in str format and returns their bits as a string.
@@ -290,13 +293,8 @@ def integer2bin(strin : str, bits : int = 8, uint : int = 0) -> str:
     # Check max.
     if dec > maxv:
         raise RuntimeError("integer2bin: number %d is bigger than %d" % (dec, maxv))
-    # Check if number is negative.
-    if dec < 0:
-        dec = dec + 2**bits
-    # Convert to binary.
-    fmt = "{0:0" + str(bits) + "b}"
-    binv = fmt.format(dec)
-    return binv
+    # Convert to binary (two's complement if negative).
+    return format(dec & ((1 << bits) - 1), '0%db' % (bits))
 
 def get_src_type (src : str) -> str:
     """
@@ -418,6 +416,311 @@ def get_reg_addr (reg : str, Type : str) -> str:
             raise RuntimeError('get_reg_addr: Register w'+ str(REG[2])+' Can not be wreg' )
     return 'X'
 
+def label_directive(directive : str, command : str, line_number : int, mem_addr : int, label_dict : dict) -> int:
+    """
+        processes a directive line during label recognition.
+        IMPORTANT: This function updates 'Alias_List'.
+
+    :returns (int): next program memory address
+    """
+    if ( directive == 'ALIAS'):
+        directive_params = list(filter(lambda x:x, command.split(' ')))
+        if len(directive_params) != 3:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: ALIAS Parameters error in line ' + str(line_number) )
+        A_Name    = directive_params[1]
+        A_Reg     = directive_params[2]
+        if not check_name(A_Name):
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Alias Name Error in line ' + str(line_number) )
+        if A_Name in Alias_List:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Alias "' + A_Name  +'" already in use as ALIAS in line ' + str(line_number) )
+        if A_Name in label_dict:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Alias "' + A_Name  +'" already in use as LABEL in line ' + str(line_number) )
+        if not check_reg(A_Reg):
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Register Name error in line ' + str(line_number) )
+        Alias_List.update({ A_Name : A_Reg } )
+        logger.info("ALIAS_RECOGNITION:  > " + A_Reg + ' is called ' + A_Name)
+    elif ( directive == 'CONST'):
+        directive_params = list(filter(lambda x:x, command.split(' ')))
+        if len(directive_params) != 3:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: CONST Parameters error in line ' + str(line_number) )
+        C_name    = directive_params[1]
+        C_val    = directive_params[2]
+        if not check_name(C_name):
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Alias Name Error in line ' + str(line_number) )
+        if C_name in Alias_List:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Const "' + C_name  +'" already in use as ALIAS in line ' + str(line_number) )
+        if C_name in label_dict:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Const "' + C_name  +'" already in use as LABEL in line ' + str(line_number) )
+        lit_val = get_imm_dt (C_val, 32, 1)
+        #if error:
+        #    raise RuntimeError('DIRECTIVE_RECOGNITION: CONST '+C_name+' Value '+C_val+' is not a Literal in line ' + str(line_number) )
+        Alias_List.update({ C_name : C_val } )
+        logger.info("DIRECTIVE_RECOGNITION: > " + C_val + ' is called ' + C_name)
+    elif ( directive == 'ADDR'):
+        directive_params = list(filter(lambda x:x, command.split(' ')))
+        if len(directive_params) != 2:
+            raise RuntimeError('DIRECTIVE_RECOGNITION: ADDR Parameters error in line ' + str(line_number) )
+        if not check_num(directive_params[1]):
+            raise RuntimeError('DIRECTIVE_RECOGNITION: Address Value '+ directive_params[1] + ' error in Line ' + str(line_number))
+        Value    = int(directive_params[1])
+        distance = Value - mem_addr
+        if  (distance < 0):
+            raise RuntimeError('DIRECTIVE_RECOGNITION: New Memory Address '+str(Value)+ ' before than next empty address ('+str(mem_addr)+') in Line ' + str(line_number))
+        mem_addr = Value
+    elif ( directive == 'END'):
+        mem_addr += 1  
+    else:
+        raise RuntimeError('DIRECTIVE_RECOGNITION: Directive Not Recognized in Line ' + str(line_number))
+    return mem_addr
+
+#### TABLE-DRIVEN PARSER
+###############################################################################
+# Precompiled version of get_list(), producing the same program list.
+# Each line goes through the same steps (alias substitution, parameter extraction, checks, operand assignment),
+# but regexes are compiled once, parameter regexes are skipped when their marker is absent,
+# and the per-instruction checks and operand layouts are looked up in the tables below.
+
+RE_CMD       = re.compile(regex['CMD'])
+RE_LABEL     = re.compile(regex['LABEL'])
+RE_DIRECTIVE = re.compile(regex['DIRECTIVE'])
+RE_LIT       = re.compile(regex['LIT'])
+RE_CDS       = re.compile(regex['CDS'])
+RE_WORDS     = re.compile(r' |\(|\)|\[|\]')
+RE_OP_BIN    = re.compile(r'#b(\d+)')
+
+# (name, regex, left delimiter, right delimiter, text that must be present for the regex to match)
+PARAM_TABLE = [(key, re.compile(p['RegEx']), p['RL'], p['RR'], p['RL'] or p['RegEx'])
+               for key, p in Param_List.items()]
+
+MSG_FORBIDDEN = {
+    'WP'   : "Not allowed Write Port < -wp() >",
+    'WR'   : "Not allowed Write Register < -wr() >",
+    'WW'   : "Not allowed Write WaveMemory < -ww() >",
+    'TIME' : "{cmd} Instruction is NOT a timed intruction < -@Time >",
+}
+
+def check_forbidden(forbidden : tuple, command_info : dict, cds : list, line_number : int) -> None:
+    for key in forbidden:
+        if key in command_info:
+            raise RuntimeError("COMMAND_RECOGNITION: " + MSG_FORBIDDEN[key].format(cmd=cds[0]) + " in Line " + str(line_number))
+
+def check_reg_wr(command_info : dict, cds : list, line_number : int) -> None:
+    if (len(cds) <= 2):
+        raise RuntimeError("COMMAND_RECOGNITION: " + cds[0] + " Not enough parameters in Line " + str(line_number))
+    if (cds[1] == 'r_wave'):
+        check_forbidden(('TIME',), command_info, cds, line_number)
+    else:
+        check_forbidden(('WP', 'WR', 'WW', 'TIME'), command_info, cds, line_number)
+
+def check_dmem_wr(command_info : dict, cds : list, line_number : int) -> None:
+    check_forbidden(('WP', 'WW'), command_info, cds, line_number)
+    if ('TIME' in command_info):
+        raise RuntimeError("COMMAND_RECOGNITION: DMEM_WR is NOT a timed intruction < -@Time > in Line " + str(line_number))
+    if ('ADDR' not in command_info):
+        raise RuntimeError("COMMAND_RECOGNITION: Memory Address < [] > not set in Line " + str(line_number))
+
+def check_wmem_wr(command_info : dict, cds : list, line_number : int) -> None:
+    if ('TIME' in command_info):
+        if ('WR' in command_info):
+            raise RuntimeError("COMMAND_RECOGNITION: Not allowed SDI with Literal Time in Line " + str(line_number))
+        if ('OP' in command_info):
+            raise RuntimeError("COMMAND_RECOGNITION: Not allowed ALU Operation Operation with Literal Time in Line " + str(line_number))
+    if ('WP' in command_info and 'PORT' not in command_info):
+        raise RuntimeError("COMMAND_RECOGNITION: No Port Address < -p() > in Line " + str(line_number))
+
+def check_port(command_info : dict, cds : list, line_number : int) -> None:
+    if ('PORT' not in command_info):
+        raise RuntimeError("COMMAND_RECOGNITION: No port in PORT_WR Instruction in line " + str(line_number))
+
+def check_untimed(command_info : dict, cds : list, line_number : int) -> None:
+    check_forbidden(('WP', 'WR', 'WW', 'TIME'), command_info, cds, line_number)
+
+def check_branch(command_info : dict, cds : list, line_number : int) -> None:
+    check_forbidden(('WP', 'WW', 'TIME'), command_info, cds, line_number)
+
+def port_to_dst(command_info : dict, max_port : int, msg : str, line_number : int) -> None:
+    if ( int(command_info['PORT']) > max_port):
+        raise RuntimeError("COMMAND_RECOGNITION: " + msg + " in line " + str(line_number))
+    command_info['DST'] = command_info.pop('PORT')
+
+def ops_multi_reg(command_info : dict, cds : list, line_number : int) -> None:
+    command_info['C_OP'] = cds[1]
+    command_info['R1']   = cds[2]
+    command_info['R2']   = cds[3]
+    if ( len(cds) > 4) :
+        command_info['R3'] = cds[4]
+    if ( len(cds) > 5) :
+        command_info['R4'] = cds[5]
+        if  (cds[0] == 'NET') :
+            raise RuntimeError('COMMAND_RECOGNITION: NET command max 3 Registers in line ' + str(line_number) )
+    if ( len(cds) > 6) :
+        raise RuntimeError('COMMAND_RECOGNITION: ' + cds[0] + ' Command max 4 Registers in line ' + str(line_number) )
+
+def ops_reg_wr_label(command_info : dict, cds : list, line_number : int) -> None:
+    if (cds[2] != 'label'):
+        raise RuntimeError("COMMAND_RECOGNITION: [>3] Parameter Error in line " + str(line_number) )
+    command_info['DST']   = cds[1]
+    command_info['SRC']   = cds[2]
+    command_info['LABEL'] = cds[3]
+
+def ops_reg_wr(command_info : dict, cds : list, line_number : int) -> None:
+    if (cds[2] == 'label'):
+        raise RuntimeError("COMMAND_RECOGNITION: Missing label in line " + str(line_number))
+    command_info['DST'] = cds[1]
+    command_info['SRC'] = cds[2]
+
+def ops_dport_wr(command_info : dict, cds : list, line_number : int) -> None:
+    if ( int(command_info['PORT']) > 3):
+        raise RuntimeError("COMMAND_RECOGNITION: Data Port MAX port number is p3 in line " + str(line_number))
+    command_info['DST'] = command_info.pop('PORT')
+    command_info['SRC']  = cds[1]
+    command_info['DATA'] = cds[2]
+
+def ops_dmem_wr(command_info : dict, cds : list, line_number : int) -> None:
+    command_info['SRC'] = cds[1]
+    command_info['DST'] = '[' + command_info.pop('ADDR') + ']'
+
+def ops_trig(command_info : dict, cds : list, line_number : int) -> None:
+    command_info['SRC'] = cds[1]
+    port_to_dst(command_info, 31, "Trigger Port max por number is p31", line_number)
+
+def ops_wport_wr(command_info : dict, cds : list, line_number : int) -> None:
+    command_info['SRC'] = cds[1]
+    port_to_dst(command_info, 15, "Wave Port Port max value is 15", line_number)
+
+def ops_div_lit(command_info : dict, cds : list, line_number : int) -> None:
+    if 'LIT' not in command_info:
+        raise RuntimeError("COMMAND_RECOGNITION: Dividend Parameter Error in line " + str(line_number))
+    command_info['NUM'] = cds[1]
+    command_info['DEN'] = command_info['LIT']
+
+def ops_branch(command_info : dict, cds : list, line_number : int) -> None:
+    if cds[1] == 's15':
+        logger.info("COMMAND_RECOGNITION: BRANCH to s_addr  > line " + str(line_number))
+        command_info['ADDR'] = 's15'
+    else:
+        logger.info("COMMAND_RECOGNITION: BRANCH to label or keyword : " + cds[1] + "  > line " + str(line_number))
+        command_info['LABEL'] = cds[1]
+
+def ops_wait(command_info : dict, cds : list, line_number : int) -> int:
+    command_info['C_OP'] = cds[1]
+    # WAIT is assembled as two instructions
+    return 1
+
+def ops_dport_rd(command_info : dict, cds : list, line_number : int) -> None:
+    if 'PORT' not in command_info:
+        raise RuntimeError("COMMAND_RECOGNITION: No Port for DPORT_RD in line " + str(line_number))
+    port_to_dst(command_info, 7, "Data Port Read max value is 7", line_number)
+
+def ops_wmem_wr(command_info : dict, cds : list, line_number : int) -> None:
+    if 'ADDR' not in command_info:
+        raise RuntimeError("COMMAND_RECOGNITION: No Address for WMEM_WR in line " + str(line_number))
+    command_info['DST'] = '[' + command_info.pop('ADDR') + ']'
+
+def ops_branch_addr(command_info : dict, cds : list, line_number : int) -> None:
+    if 'ADDR' not in command_info:
+        raise RuntimeError("COMMAND_RECOGNITION: Address Parameter Error in line " + str(line_number))
+
+# Per-instruction schema: (parameter check, {number of words: operand layout}).
+# The number of words includes the instruction; '>3' covers all longer lines.
+# An operand layout is either a tuple of the keys for the words after the instruction, or a function that fills them in.
+# Word counts that aren't listed are parameter errors.
+CMD_TABLE = {
+    'NOP'      : (check_untimed, {1: ()}),
+    'TEST'     : (check_untimed, {1: ()}),
+    'RET'      : (check_untimed, {1: ()}),
+    'TIME'     : (check_untimed, {3: ('C_OP', 'R1'), 2: ('C_OP',)}),
+    'FLAG'     : (check_untimed, {2: ('C_OP',)}),
+    'ARITH'    : (check_untimed, {'>3': ops_multi_reg, 1: ()}),
+    'DIV'      : (check_untimed, {3: ('NUM', 'DEN'), 2: ops_div_lit}),
+    'NET'      : (check_untimed, {'>3': ops_multi_reg, 3: ('C_OP', 'R1'), 2: ('C_OP',)}),
+    'COM'      : (check_untimed, {3: ('C_OP', 'R1'), 2: ('C_OP',)}),
+    'PA'       : (check_untimed, {'>3': ops_multi_reg, 3: ('C_OP', 'R1'), 2: ('C_OP',)}),
+    'PB'       : (check_untimed, {'>3': ops_multi_reg, 3: ('C_OP', 'R1'), 2: ('C_OP',)}),
+    'JUMP'     : (check_branch,  {2: ops_branch, 1: ops_branch_addr}),
+    'CALL'     : (check_branch,  {2: ops_branch, 1: ops_branch_addr}),
+    'REG_WR'   : (check_reg_wr,  {'>3': ops_reg_wr_label, 3: ops_reg_wr}),
+    'DMEM_WR'  : (check_dmem_wr, {2: ops_dmem_wr}),
+    'WMEM_WR'  : (check_wmem_wr, {1: ops_wmem_wr}),
+    'DPORT_WR' : (check_port,    {3: ops_dport_wr}),
+    'WPORT_WR' : (check_port,    {2: ops_wport_wr}),
+    'TRIG'     : (check_port,    {2: ops_trig}),
+    'DPORT_RD' : (None,          {1: ops_dport_rd}),
+    'WAIT'     : (None,          {2: ops_wait}),
+    'CLEAR'    : (None,          {2: ('C_OP',)}),
+}
+
+def parse_command(command : str, line_number : int, mem_addr : int, alias_order : dict) -> (dict, int):
+    """
+        parses one instruction line, see Assembler.parse_list().
+
+    :command (str): stripped line, starting with a recognized instruction
+    :line_number (int): line number, for error messages
+    :mem_addr (int): program memory address of the instruction
+    :alias_order (dict): position of each Alias_List key, aliases are replaced in this order
+    :returns (tuple): (command_info, number of program memory words used)
+    """
+    command_info = {'P_ADDR': mem_addr}
+    # CHECK for Literal Values
+    if '#' in command:
+        LIT = RE_LIT.findall(command)
+        if (len(LIT) == 2 and LIT[0] != LIT[1]):
+            raise RuntimeError('COMMAND_RECOGNITION: Literals not equals in Line ' + str(line_number))
+    # CHANGE ALIAS
+    aliases = {word for word in RE_WORDS.split(command) if word in alias_order}
+    for key in sorted(aliases, key=alias_order.__getitem__):
+        command = command.replace(key, Alias_List[key])
+    # Extract PARAMETERS
+    command_info['LINE'] = line_number
+    for key, pattern, left, right, marker in PARAM_TABLE:
+        if marker in command:
+            PARAM = pattern.findall(command)
+            if PARAM:
+                if (len(PARAM) > 1):
+                    raise RuntimeError('COMMAND_RECOGNITION: Duplicated Parameter ' + key +' in line '+str(line_number))
+                command_info[key] = PARAM[0].strip()
+                command = command.replace(left + PARAM[0] + right, '')
+    cds = RE_CDS.findall(command)
+    ## SINGLE PARAMETERS CHECK
+    if ('OP' in command_info):
+        param_op = RE_OP_BIN.findall(command_info['OP'])
+        if param_op:
+            try:
+                int(param_op[0], 2)
+            except ValueError:
+                raise RuntimeError("COMMAND_RECOGNITION: Binary value incorrect in Line " + str(line_number))
+    if ('LIT' in command_info):
+        lit = command_info['LIT'].replace('_', '')
+        if (lit[0] == 'b'):
+            try:
+                lit = str(int(lit[1:], 2))
+            except ValueError:
+                raise RuntimeError("COMMAND_RECOGNITION: Binary value incorrect in Line " + str(line_number))
+        command_info['LIT'] = '#' + lit
+    if ('TIME' in command_info):
+        command_info['TIME'] = '@' + command_info['TIME']
+    if ('WW' in command_info):
+        command_info['WW'] = '1'
+    if ('UF' in command_info):
+        command_info['UF'] = '1'
+        if not ('OP' in command_info):
+            raise RuntimeError("COMMAND_RECOGNITION: No Operation < -op() > set for Flag Update < -uf > in Line " + str(line_number))
+    ## COMMAND VERIFICATION AND OPERANDS
+    check, layouts = CMD_TABLE.get(cds[0], (None, {}))
+    if check is not None:
+        check(command_info, cds, line_number)
+    command_info['CMD'] = cds[0]
+    n_words = '>3' if len(cds) > 3 else len(cds)
+    layout = layouts.get(n_words)
+    if layout is None:
+        raise RuntimeError("COMMAND_RECOGNITION: [%s] Parameter Error in line %d" % (n_words, line_number))
+    if isinstance(layout, tuple):
+        command_info.update(zip(layout, cds[1:]))
+        extra = None
+    else:
+        extra = layout(command_info, cds, line_number)
+    return command_info, 1 + (extra or 0)
+
 class LFSR:
     def __init__(self):
         self.val_bin = '00000000000000000000000000000000'
@@ -561,7 +864,7 @@ class Assembler():
                     line = line[:comment]
                 parsed_file.append(line.strip())
 
-        program_list, label_dict = Assembler.get_list(parsed_file)
+        program_list, label_dict = Assembler.parse_list(parsed_file)
         return (program_list, label_dict)
 
     def str_asm2list(asm_str : str) -> tuple:
@@ -573,7 +876,7 @@ class Assembler():
                 line = line[:comment]
             parsed_asm.append(line.strip())
 
-        program_list, label_dict = Assembler.get_list(parsed_asm)
+        program_list, label_dict = Assembler.parse_list(parsed_asm)
         return (program_list, label_dict)
     
 
@@ -619,54 +922,7 @@ class Assembler():
                         label_dict[label] = '&' + str(mem_addr)
                         label_line_idxs.append(line_number)
                     elif (directive):  # identify Aliases and adds them to Alias_List.
-                        if ( directive == 'ALIAS'):
-                            directive_params = list(filter(lambda x:x, command.split(' ')))
-                            if len(directive_params) != 3:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: ALIAS Parameters error in line ' + str(line_number) )
-                            A_Name    = directive_params[1]
-                            A_Reg     = directive_params[2]
-                            if not check_name(A_Name):
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Alias Name Error in line ' + str(line_number) )
-                            if A_Name in Alias_List:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Alias "' + A_Name  +'" already in use as ALIAS in line ' + str(line_number) )
-                            if A_Name in label_dict:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Alias "' + A_Name  +'" already in use as LABEL in line ' + str(line_number) )
-                            if not check_reg(A_Reg):
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Register Name error in line ' + str(line_number) )
-                            Alias_List.update({ A_Name : A_Reg } )
-                            logger.info("ALIAS_RECOGNITION:  > " + A_Reg + ' is called ' + A_Name)
-                        elif ( directive == 'CONST'):
-                            directive_params = list(filter(lambda x:x, command.split(' ')))
-                            if len(directive_params) != 3:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: CONST Parameters error in line ' + str(line_number) )
-                            C_name    = directive_params[1]
-                            C_val    = directive_params[2]
-                            if not check_name(C_name):
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Alias Name Error in line ' + str(line_number) )
-                            if C_name in Alias_List:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Const "' + C_name  +'" already in use as ALIAS in line ' + str(line_number) )
-                            if C_name in label_dict:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Const "' + C_name  +'" already in use as LABEL in line ' + str(line_number) )
-                            lit_val = get_imm_dt (C_val, 32, 1)
-                            #if error:
-                            #    raise RuntimeError('DIRECTIVE_RECOGNITION: CONST '+C_name+' Value '+C_val+' is not a Literal in line ' + str(line_number) )
-                            Alias_List.update({ C_name : C_val } )
-                            logger.info("DIRECTIVE_RECOGNITION: > " + C_val + ' is called ' + C_name)
-                        elif ( directive == 'ADDR'):
-                            directive_params = list(filter(lambda x:x, command.split(' ')))
-                            if len(directive_params) != 2:
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: ADDR Parameters error in line ' + str(line_number) )
-                            if not check_num(directive_params[1]):
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: Address Value '+ directive_params[1] + ' error in Line ' + str(line_number))
-                            Value    = int(directive_params[1])
-                            distance = Value - mem_addr
-                            if  (distance < 0):
-                                raise RuntimeError('DIRECTIVE_RECOGNITION: New Memory Address '+str(Value)+ ' before than next empty address ('+str(mem_addr)+') in Line ' + str(line_number))
-                            mem_addr = Value
-                        elif ( directive == 'END'):
-                            mem_addr += 1  
-                        else:
-                            raise RuntimeError('DIRECTIVE_RECOGNITION: Directive Not Recognized in Line ' + str(line_number))
+                        mem_addr = label_directive(directive, command, line_number, mem_addr, label_dict)
                     elif (instruction): # Identify instructions to correctly set addresses.
                         if instruction not in instList.keys():
                             raise RuntimeError('CMD_RECOGNITION: Command Not Recognized in Line ' + str(line_number))
@@ -1003,6 +1259,68 @@ class Assembler():
 
         return (program_list, label_dict)
 
+    @staticmethod
+    def parse_list(asm_lines : list) -> tuple:
+        """
+            table-driven equivalent of get_list(), which is kept as the reference implementation.
+            Returns the same program list and label dictionary, and raises the same errors.
+            Each line is classified once, and instructions are parsed with parse_command().
+            :asm_lines (list): ASM as a list of lines, stripped and without comments.
+            :returns (tuple): (program_list, label_dict)
+        """
+        ##### STEP_1 - LABEL RECOGNITION
+        label_dict = {}
+        statements = [] # (line_number, command, directive, instruction)
+        mem_addr = 1 # address 0 goes NOP
+        for line_number, command in enumerate(asm_lines, start=1):
+            if not command:
+                continue
+            label = RE_LABEL.search(command) if ':' in command else None
+            if (label):
+                label = label.group()
+                check_name(command[:-1])
+                if label in label_dict:
+                    raise RuntimeError('LABEL_RECOGNITION: Label  "' + label + '" already in use as LABEL in line ' + str(line_number) )
+                if label in Alias_List:
+                    raise RuntimeError('LABEL_RECOGNITION: Label "' + label + '" already in use as ALIAS in line ' + str(line_number) )
+                if (label == 'reg'):
+                    raise RuntimeError('LABEL_RECOGNITION: reg is not a valid label in line  ' + str(line_number) )
+                label_dict[label] = '&' + str(mem_addr)
+                continue
+            directive = RE_DIRECTIVE.search(command) if '.' in command else None
+            if (directive):
+                directive = directive.group()
+                mem_addr = label_directive(directive, command, line_number, mem_addr, label_dict)
+                statements.append((line_number, command, directive, None))
+                continue
+            instruction = RE_CMD.match(command)
+            if not (instruction):
+                raise RuntimeError('CMD_RECOGNITION: Instruction Not Recognized in Line ' + str(line_number))
+            instruction = instruction.group()
+            if instruction not in instList:
+                raise RuntimeError('CMD_RECOGNITION: Command Not Recognized in Line ' + str(line_number))
+            mem_addr += 2 if (instruction == 'WAIT') else 1
+            statements.append((line_number, command, None, instruction))
+
+        ##### STEP_2 - COMMAND RECOGNITION
+        program_list = [{'P_ADDR': 0, 'CMD': 'NOP'}]
+        alias_order = {key: i for i, key in enumerate(Alias_List)}
+        mem_addr = 0
+        for line_number, command, directive, instruction in statements:
+            if (instruction):
+                command_info, size = parse_command(command, line_number, mem_addr + 1, alias_order)
+                program_list.append(command_info)
+                mem_addr += size
+            elif ( directive == 'END'):
+                mem_addr += 1
+                program_list.append({'LINE': line_number, 'P_ADDR': mem_addr, 'ADDR': '&' + str(mem_addr), 'CMD': 'JUMP'})
+            elif ( directive == 'ADDR'):
+                Value = int(command.split()[1])
+                for ind in range(Value - mem_addr - 1):
+                    mem_addr += 1
+                    program_list.append({'P_ADDR': mem_addr, 'LINE': line_number, 'CMD': 'NOP'})
+        return (program_list, label_dict)
+
     @staticmethod
     def list2bin(program_list : list, label_dict : dict = {}, save_unparsed_filename : str = "") -> list:
         """
@@ -0,0 +1,244 @@
+import time
+import numpy as np
+import pytest
+
+from qick.qick_asm import AcquireMixin, ShotClassifier
+from qick.streamer import DataStreamer
+
+class FakeSoc:
+    """Stands in for QickSoc, with a real DataStreamer reading from a fake accumulated buffer.
+    Each start of the tProc runs one round: the shot counter advances by step shots per read (or jumps to the total), and the buffer holds
+    values that depend on the round number, channel and buffer address.
+    """
+    def __init__(self, maxlen=2**14, nch=2, step=None):
+        self.maxlen = maxlen
+        self.step = step
+        self.round = 0
+        self.total = 0
+        self.count = 0
+        self.cfg = {'readouts': [{'avg_maxlen': maxlen} for ch in range(nch)]}
+        self.streamer = DataStreamer(self)
+
+    def __getitem__(self, key):
+        return self.cfg[key]
+
+    def reload_mem(self): pass
+    def clear_tproc_counter(self, addr): pass
+    def prepare_round(self): pass
+    def cleanup_round(self): pass
+    def start_src(self, src): pass
+
+    def start_tproc(self):
+        self.round += 1
+        self.count = 0
+
+    def get_tproc_counter(self, addr):
+        if self.step is None:
+            return self.total
+        self.count = min(self.count + self.step, self.total)
+        return self.count
+
+    def group_avg_dmas(self, ch_list):
+        return [list(range(len(ch_list)))]
+
+    def get_accumulated(self, ch, address, length, out=None):
+        addrs = (np.arange(length) + address) % self.maxlen
+        i = (addrs*7919 + self.round*104729 + ch*31) % 1009
+        data = np.stack([i, 1009-2*i], axis=1).astype(np.int32)
+        if out is None:
+            return data
+        out[:] = data
+        return out
+
+    def start_readout(self, total_shots, counter_addr=1, ch_list=None, reads_per_shot=1, stride=None, out_bufs=None):
+        self.total = total_shots
+        self.streamer.stop_flag.clear()
+        self.streamer.submit_job(total_shots, counter_addr, ch_list, reads_per_shot, stride, out_bufs)
+
+    def poll_data(self, totaltime=0.1, timeout=None):
+        return self.streamer.poll_data(totaltime=totaltime, timeout=timeout)
+
+class FakeProgram(AcquireMixin):
+    """Acquisition with two readouts over a 2D sweep, without a real program behind it."""
+    def __init__(self, loop_dims=(20, 3), avg_level=0):
+        self.dump_keys = []
+        super().__init__()
+        self.soccfg = {'readouts': [{'iq_offset': 0.5}]*2}
+        self.counter_addr = 1
+        self.loop_dims = list(loop_dims)
+        self.avg_level = avg_level
+        self.ro_chs = {0: {'trigs': 1, 'length': 10, 'edge_counting': False, 'ro_config': None},
+                       1: {'trigs': 2, 'length': 100, 'edge_counting': False, 'ro_config': None}}
+
+    def config_all(self, soc, **kwargs): pass
+    def config_bufs(self, soc, **kwargs): pass
+    def _ro_offset(self, ch, cfg): return 0
+
+@pytest.fixture(scope='module')
+def soc():
+    return FakeSoc()
+
+def run(prog, soc, **kwargs):
+    # restart the fake data from round 1, so acquisitions can be compared
+    soc.round = 0
+    return prog.acquire(soc, progress=False, **kwargs)
+
+@pytest.mark.parametrize("acc_dtype, expected", [(None, np.int32), (np.int64, np.int64), (np.int32, np.int32)])
+def test_acc_dtype(soc, acc_dtype, expected):
+    ref = run(FakeProgram(), soc, rounds=2, extra_args={'acc_dtype': np.int64})
+    prog = FakeProgram()
+    data = run(prog, soc, rounds=2, extra_args=None if acc_dtype is None else {'acc_dtype': acc_dtype})
+    assert all(raw.dtype == expected for raw in prog.get_raw())
+    for d, r in zip(data, ref):
+        assert np.array_equal(d, r)
+
+def test_acc_dtype_overflow(soc):
+    # a window longer than 2**16 samples could overflow int32
+    prog = FakeProgram()
+    prog.ro_chs[1]['length'] = 2**16+1
+    run(prog, soc, rounds=1)
+    assert [raw.dtype for raw in prog.get_raw()] == [np.int32, np.int64]
+    with pytest.raises(RuntimeError):
+        run(prog, soc, rounds=1, extra_args={'acc_dtype': np.int32})
+
+def reference_shots(prog, raw, thresholds, angle):
+    # the straightforward calculation: normalize, remove the offset, rotate, and compare with the threshold
+    shots = []
+    for (ch, ro), buf, threshold in zip(prog.ro_chs.items(), raw, thresholds):
+        iq = buf/ro['length'] - prog.soccfg['readouts'][ch]['iq_offset']
+        proj = iq[..., 0]*np.cos(angle) + iq[..., 1]*np.sin(angle)
+        shots.append(np.heaviside(proj - threshold, 0))
+    return shots
+
+def test_threshold(soc):
+    prog = FakeProgram()
+    run(prog, soc, rounds=2, threshold=[50, 5], angle=0.3)
+    shots = prog.get_shots()
+    assert all(s.dtype == np.float32 for s in shots)
+    for s, ref in zip(shots, reference_shots(prog, prog.get_raw(), [50, 5], 0.3)):
+        assert 0 < ref.mean() < 1
+        assert np.array_equal(s, ref)
+
+def test_threshold_reuse(soc, monkeypatch):
+    prog = FakeProgram()
+    run(prog, soc, rounds=1, threshold=[50, 5], angle=[0.3, 0.3])
+    shots = [s.copy() for s in prog.get_shots()]
+    # equal parameters passed as new objects reuse the classifier built by acquire()
+    built = []
+    orig = ShotClassifier.from_readouts
+    def from_readouts(*args, **kwargs):
+        built.append(args)
+        return orig(*args, **kwargs)
+    monkeypatch.setattr(ShotClassifier, 'from_readouts', from_readouts)
+    zeros = [np.zeros_like(raw) for raw in prog.get_raw()]
+    new = prog._apply_threshold(zeros, [50.0, np.float64(5)], [0.3, 0.3], True)
+    assert not built
+    assert all(not s.any() for s in new)
+    prog._apply_threshold(zeros, [50, 6], [0.3, 0.3], True)
+    assert len(built) == 1
+    # the shots of the acquisition are not overwritten
+    for s, old in zip(prog.get_shots(), shots):
+        assert np.array_equal(s, old)
+
+@pytest.mark.parametrize("loop_dims, avg_level", [((20, 3), 0), ((4, 30, 3), 1), ((5, 40), 1)])
+@pytest.mark.parametrize("threshold", [None, [50, 5]])
+def test_hist(loop_dims, avg_level, threshold):
+    # the shots arrive in many chunks
+    soc = FakeSoc(maxlen=64, step=20)
+    kwargs = dict(rounds=2, threshold=threshold)
+    ref = run(FakeProgram(loop_dims, avg_level), soc, **kwargs)
+    prog = FakeProgram(loop_dims, avg_level)
+    data = run(prog, soc, hist_bins=10, **kwargs)
+    # the averaged data is the same as without the histogram
+    for d, r in zip(data, ref):
+        assert d.shape == r.shape
+        assert np.allclose(d, r)
+    nshots = 2*np.prod(loop_dims)
+    for (counts, iedges, qedges), ro in zip(prog.get_hist(), prog.ro_chs.values()):
+        assert counts.shape == (10, 10)
+        # the automatic edges are set from the first chunk, so later shots may fall outside them
+        assert 0 < counts.sum() <= nshots*ro['trigs']
+    if threshold is not None:
+        for state_counts, ro in zip(prog.get_state_counts(), prog.ro_chs.values()):
+            assert state_counts.sum() == nshots*ro['trigs']
+
+class SlowProgram(FakeProgram):
+    """Processing takes long enough that pipelined rounds overlap it with the next round."""
+    def _process_accumulated(self, acc_buf):
+        time.sleep(0.005)
+        return super()._process_accumulated(acc_buf)
+
+@pytest.mark.parametrize("threshold", [None, [50, 5]])
+@pytest.mark.parametrize("keep_rounds", [True, False])
+def test_pipeline(soc, threshold, keep_rounds):
+    kwargs = dict(rounds=5, threshold=threshold, keep_rounds=keep_rounds)
+    plain = SlowProgram()
+    ref = run(plain, soc, **kwargs)
+    prog = SlowProgram()
+    data = run(prog, soc, pipeline=True, **kwargs)
+    # each round's raw data must be processed before the buffer is reused
+    for d, r in zip(data, ref):
+        assert np.array_equal(d, r)
+    for d, r in zip(prog.get_std_err(), plain.get_std_err()):
+        assert np.allclose(d, r)
+    for d, r in zip(prog.get_raw(), plain.get_raw()):
+        assert np.array_equal(d, r)
+    if keep_rounds:
+        for round_d, round_r in zip(prog.get_rounds(), plain.get_rounds()):
+            for d, r in zip(round_d, round_r):
+                assert np.array_equal(d, r)
+    assert prog.get_rounds_completed() == 5
+
+@pytest.mark.parametrize("threshold", [None, [50, 5]])
+def test_running_stats(soc, threshold):
+    kept = FakeProgram()
+    ref = run(kept, soc, rounds=6, threshold=threshold)
+    # with the rounds kept, the statistics come from them
+    assert kept.rounds_acc is None
+    prog = FakeProgram()
+    data = run(prog, soc, rounds=6, threshold=threshold, keep_rounds=False)
+    assert prog.get_rounds() is None
+    for d, r in zip(data, ref):
+        assert np.allclose(d, r)
+    for d, r in zip(prog.get_std_err(), kept.get_std_err()):
+        assert np.any(r > 0)
+        assert np.allclose(d, r)
+
+@pytest.mark.parametrize("keep_rounds", [True, False])
+def test_target_err(soc, keep_rounds):
+    target = 1.5
+    prog = FakeProgram()
+    run(prog, soc, rounds=100, keep_rounds=keep_rounds, target_err=target)
+    n = prog.get_rounds_completed()
+    assert 2 < n < 100
+    assert all(np.all(e <= target) for e in prog.get_std_err())
+    # one round fewer would not have been enough
+    short = FakeProgram()
+    run(short, soc, rounds=n-1)
+    assert not all(np.all(e <= target) for e in short.get_std_err())
+
+def test_target_err_pipeline(soc):
+    target = 1.5
+    plain = FakeProgram()
+    run(plain, soc, rounds=100, target_err=target)
+    prog = FakeProgram()
+    run(prog, soc, rounds=100, target_err=target, pipeline=True)
+    # the decision is made on the rounds processed so far, so one more round may run
+    n = plain.get_rounds_completed()
+    assert n <= prog.get_rounds_completed() <= n + 1
+    for round_d, round_r in zip(prog.get_rounds()[:n], plain.get_rounds()):
+        for d, r in zip(round_d, round_r):
+            assert np.array_equal(d, r)
+    # the raw data is from the last round that was run
+    last = FakeProgram()
+    run(last, soc, rounds=prog.get_rounds_completed())
+    for d, r in zip(prog.get_raw(), last.get_raw()):
+        assert np.array_equal(d, r)
+
+def test_time_budget(soc):
+    prog = FakeProgram()
+    data = run(prog, soc, rounds=100, time_budget=0)
+    # the round in progress is always completed
+    assert prog.get_rounds_completed() == 1
+    assert len(prog.get_rounds()) == 1
+    assert data[0].shape == (1, 3, 2)
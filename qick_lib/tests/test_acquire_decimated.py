@@ -0,0 +1,128 @@
+import logging
+import time
+import numpy as np
+import pytest
+
+from qick.qick_asm import AcquireMixin, RoundSum
+
+class FakeSoc:
+    """Stands in for QickSoc: the shot counter advances at a fixed rate after start_tproc(),
+    and the decimated buffer holds I = buffer address + 1000*(round-1), Q = -(buffer address).
+    """
+    def __init__(self, total, rate=300, maxlen=1000):
+        self.total = total
+        self.rate = rate
+        self.maxlen = maxlen
+        self.t_start = None
+        self.round = 0
+        self.acc_reads = []
+
+    def reload_mem(self): pass
+    def clear_tproc_counter(self, addr): pass
+    def prepare_round(self): pass
+    def cleanup_round(self): pass
+    def start_src(self, src): pass
+
+    def start_tproc(self):
+        self.t_start = time.time()
+        self.round += 1
+
+    def get_tproc_counter(self, addr):
+        return min(int((time.time()-self.t_start)*self.rate), self.total)
+
+    def get_decimated(self, ch, address, length):
+        assert 0 <= address and 0 < length and address+length <= self.maxlen
+        addrs = np.arange(address, address+length)
+        return np.stack([addrs + 1000*(self.round-1), -addrs], axis=1).astype(np.int32)
+
+    def get_accumulated(self, ch, address, length):
+        self.acc_reads.append(ch)
+        return np.ones((length, 2), dtype=np.int64)
+
+class FakeProgram(AcquireMixin):
+    """Acquisition with two readouts and a fixed number of shots, without a real program behind it."""
+    def __init__(self, total, maxlen=1000, avg_maxlen=None):
+        self.dump_keys = []
+        super().__init__()
+        if avg_maxlen is None:
+            avg_maxlen = 3*total
+        self.soccfg = {'readouts': [{'iq_offset': 0, 'buf_maxlen': maxlen, 'avg_maxlen': avg_maxlen}]*2}
+        self.counter_addr = 1
+        self.loop_dims = [total]
+        self.avg_level = 0
+        self.ro_chs = {0: {'trigs': 1, 'length': 30, 'edge_counting': False, 'ro_config': None},
+                       1: {'trigs': 3, 'length': 20, 'edge_counting': False, 'ro_config': None}}
+
+    def config_all(self, soc, **kwargs): pass
+    def config_bufs(self, soc, **kwargs): pass
+    def _ro_offset(self, ch, cfg): return 0
+
+def test_stream_long_trace():
+    total = 60
+    prog = FakeProgram(total)
+    soc = FakeSoc(total)
+    data = prog.acquire_decimated(soc, rounds=1, progress=False, stream=True)
+    for d, ro in zip(data, prog.ro_chs.values()):
+        n = ro['length']*ro['trigs']*total
+        # much longer than the buffer, so the data has wrapped around it
+        assert n > soc.maxlen
+        assert np.array_equal(d.reshape(-1, 2)[:, 0], np.arange(n) % soc.maxlen)
+
+@pytest.mark.parametrize("avg_maxlen, read", [(3*60, True), (3*60-1, False)])
+def test_stream_acc_limit(caplog, avg_maxlen, read):
+    total = 60
+    prog = FakeProgram(total, avg_maxlen=avg_maxlen)
+    soc = FakeSoc(total)
+    with caplog.at_level(logging.WARNING, logger="qick.qick_asm"):
+        prog.acquire_decimated(soc, rounds=1, progress=False, stream=True)
+    # readout 0 (1 trig) always fits; readout 1 (3 trigs) fits exactly, or is one too many
+    assert soc.acc_reads == ([0, 1] if read else [0])
+    assert ("accumulated data" in caplog.text) != read
+
+def test_no_stream_reads_acc():
+    # without streaming, the accumulated data is always read
+    total = 10
+    prog = FakeProgram(total, avg_maxlen=1)
+    soc = FakeSoc(total, rate=1e6)
+    prog.acquire_decimated(soc, rounds=1, progress=False)
+    assert soc.acc_reads == [0, 1]
+
+class SlowProgram(FakeProgram):
+    """Processing takes long enough that pipelined rounds overlap it with the next round."""
+    def _process_decimated(self, dec_buf):
+        time.sleep(0.005)
+        return super()._process_decimated(dec_buf)
+
+@pytest.mark.parametrize("keep_rounds", [True, False])
+def test_pipeline(keep_rounds):
+    total = 10
+    kwargs = dict(rounds=4, progress=False, keep_rounds=keep_rounds)
+    plain = SlowProgram(total)
+    ref = plain.acquire_decimated(FakeSoc(total, rate=1e6), **kwargs)
+    prog = SlowProgram(total)
+    data = prog.acquire_decimated(FakeSoc(total, rate=1e6), pipeline=True, **kwargs)
+    for d, r in zip(data, ref):
+        assert np.array_equal(d, r)
+    if keep_rounds:
+        for d, r in zip(prog.get_std_err(), plain.get_std_err()):
+            assert np.allclose(d, r)
+    assert prog.get_rounds_completed() == 4
+
+def test_running_sum():
+    total = 10
+    kept = FakeProgram(total)
+    ref = kept.acquire_decimated(FakeSoc(total, rate=1e6), rounds=3, progress=False)
+    prog = FakeProgram(total)
+    data = prog.acquire_decimated(FakeSoc(total, rate=1e6), rounds=3, progress=False, keep_rounds=False)
+    # only an integer sum is kept, and processed at the end
+    assert isinstance(prog.rounds_acc, RoundSum)
+    assert prog.get_rounds() is None
+    assert prog.get_std_err() is None
+    for d, r in zip(data, ref):
+        assert np.allclose(d, r)
+
+def test_time_budget():
+    total = 10
+    prog = FakeProgram(total)
+    prog.acquire_decimated(FakeSoc(total, rate=1e6), rounds=100, progress=False, time_budget=0)
+    assert prog.get_rounds_completed() == 1
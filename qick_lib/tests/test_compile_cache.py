@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pytest
+
+from qick import QickConfig, CompileCache
+from qick.qick_asm import AbsQickProgram
+from qick.asm_v2 import AveragerProgramV2, QickSweep1D
+
+SOCCFG = os.path.join(os.path.dirname(__file__), '..', '..', 'firmware', 'testbench', 'qick_testbench', 'soccfg.json')
+
+@pytest.fixture(scope='module')
+def soccfg():
+    return QickConfig(SOCCFG)
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = CompileCache(str(tmp_path))
+    monkeypatch.setattr(AbsQickProgram, 'compile_cache', cache)
+    return cache
+
+def make_class(gain):
+    # a fresh class each time, as if the user re-ran the cell that defines it
+    class LoopbackProgram(AveragerProgramV2):
+        def _initialize(self, cfg):
+            self.declare_gen(ch=0, nqz=1)
+            self.declare_readout(ch=0, length=1.0)
+            self.add_readoutconfig(ch=0, name="rc", freq=cfg['freq'], gen_ch=0)
+            self.add_loop("freq_loop", 10)
+            self.add_gauss(ch=0, name="g", sigma=0.05, length=0.2)
+            self.add_pulse(ch=0, name="pulse", style="arb", envelope="g", freq=cfg['freq'], phase=0, gain=gain)
+        def _body(self, cfg):
+            self.send_readoutconfig(ch=0, name="rc", t=0)
+            self.pulse(ch=0, name="pulse", t=0)
+            self.trigger(ros=[0], t=0.1)
+    return LoopbackProgram
+
+@pytest.mark.parametrize('freq', [100, QickSweep1D("freq_loop", 100, 200)], ids=['scalar', 'sweep'])
+def test_cache_hit(soccfg, cache, freq):
+    cls = make_class(0.5)
+    prog1 = cls(soccfg, reps=10, final_delay=1, cfg={'freq': freq})
+    assert (cache.hits, cache.misses) == (0, 1)
+    prog2 = make_class(0.5)(soccfg, reps=10, final_delay=1, cfg={'freq': freq})
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert prog2.asm() == prog1.asm()
+    for mem in ['pmem', 'wmem']:
+        assert np.array_equal(prog2.binprog[mem], prog1.binprog[mem])
+    assert np.allclose(prog2.get_pulse_param('pulse', 'freq', as_array=True),
+                       prog1.get_pulse_param('pulse', 'freq', as_array=True))
+
+def test_cache_code_change(soccfg, cache):
+    orig_cls = make_class(0.5)
+    # the same program after the user edits _body() (in a way that doesn't change the program)
+    class LoopbackProgram(AveragerProgramV2):
+        _initialize = orig_cls._initialize
+        def _body(self, cfg):
+            if cfg['freq'] is not None:
+                orig_cls._body(self, cfg)
+    LoopbackProgram.__qualname__ = orig_cls.__qualname__
+    orig_cls(soccfg, reps=10, final_delay=1, cfg={'freq': 100})
+    make_class(0.5)(soccfg, reps=10, final_delay=1, cfg={'freq': 100})
+    assert (cache.hits, cache.misses) == (1, 1)
+    LoopbackProgram(soccfg, reps=10, final_delay=1, cfg={'freq': 100})
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,42 @@
+import os
+import functools
+import numpy as np
+import pytest
+
+from qick import QickConfig
+from qick.asm_v2 import AveragerProgramV2, QickProgramV2
+from qick.helpers import compile_progs
+
+SOCCFG = os.path.join(os.path.dirname(__file__), '..', '..', 'firmware', 'testbench', 'qick_testbench', 'soccfg.json')
+
+@pytest.fixture(scope='module')
+def soccfg():
+    return QickConfig(SOCCFG)
+
+# defined at module level, so worker processes can unpickle it
+class PulseProgram(AveragerProgramV2):
+    def _initialize(self, cfg):
+        self.declare_gen(ch=0, nqz=1)
+        self.declare_readout(ch=0, length=1.0)
+        self.add_gauss(ch=0, name="g", sigma=0.05, length=0.2)
+        self.add_pulse(ch=0, name="pulse", style="arb", envelope="g", freq=cfg['freq'], phase=0, gain=cfg['gain'])
+    def _body(self, cfg):
+        self.pulse(ch=0, name="pulse", t=0)
+        self.trigger(ros=[0], t=0.1)
+
+def test_compile_progs(soccfg):
+    factory = functools.partial(PulseProgram, soccfg, reps=10, final_delay=1)
+    cfgs = [{'freq': f, 'gain': g} for f in [100, 200, 300] for g in [0.1, 0.5]]
+    progdicts, times = compile_progs(factory, {'cfg': cfgs}, max_workers=2)
+    assert len(progdicts) == len(cfgs)
+    assert times.shape == (len(cfgs),)
+    for cfg, progdict in zip(cfgs, progdicts):
+        prog = QickProgramV2(soccfg)
+        prog.load_prog(progdict)
+        ref = PulseProgram(soccfg, reps=10, final_delay=1, cfg=cfg)
+        assert np.array_equal(prog.binprog['pmem'], ref.binprog['pmem'])
+        assert prog.binprog['wmem'] == ref.binprog['wmem']
+
+def test_compile_progs_empty():
+    progdicts, times = compile_progs(PulseProgram, [])
+    assert progdicts == [] and len(times) == 0
@@ -0,0 +1,107 @@
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("pynq", exc_type=ImportError)
+from pynq.overlay import DefaultIP
+from qick.ip import SocIP
+from qick.drivers.tproc import Axis_QICK_Proc
+
+class CountingArray:
+    """Register array that counts MMIO operations; a slice access counts as one."""
+    def __init__(self, n):
+        self.data = np.zeros(n, dtype=np.uint32)
+        self.reads = 0
+        self.writes = []
+
+    def __getitem__(self, index):
+        self.reads += 1
+        return self.data[index]
+
+    def __setitem__(self, index, value):
+        self.writes.append((index, np.array(value, dtype=np.uint32).tolist()))
+        self.data[index] = value
+
+class FakeMMIO:
+    def __init__(self, n):
+        self.array = CountingArray(n)
+
+@pytest.fixture(autouse=True)
+def fake_mmio(monkeypatch):
+    # replace the pynq constructor, which would map the physical address
+    def init(self, description):
+        self.mmio = FakeMMIO(16)
+    monkeypatch.setattr(DefaultIP, '__init__', init)
+
+class FakeIP(SocIP):
+    SHADOW_REGS = ['a', 'b']
+    def _init_config(self, description):
+        self.REGISTERS = {'a': 0, 'b': 1, 'c': 2, 'status': 3}
+
+DESCRIPTION = {'type': 'fake:fake:fake:1.0', 'fullpath': 'fake_0'}
+
+def test_shadow():
+    ip = FakeIP(DESCRIPTION)
+    mmio = ip.mmio.array
+    ip.a = 5
+    ip.c = 7
+    assert ip.a == 5 and ip.c == 7
+    # the shadowed register is read from the cache
+    assert mmio.reads == 1
+    ip.a |= 2
+    assert mmio.data[0] == 7 and mmio.reads == 1
+    ip.invalidate_regs()
+    mmio.data[0] = 9
+    assert ip.a == 9 and mmio.reads == 2
+    assert ip.get_mmio_counts() == {'reads': 2, 'writes': 3}
+
+def test_transaction():
+    ip = FakeIP(DESCRIPTION)
+    mmio = ip.mmio.array
+    with ip.reg_transaction():
+        ip.a = 1
+        ip.b = 2
+        ip.c = 3
+        assert mmio.writes == []
+        # a second write to the same register starts a new bulk write
+        ip.a = 4
+    assert mmio.writes == [(slice(0, 3), [1, 2, 3]), (slice(0, 1), [4])]
+    assert list(mmio.data[:3]) == [4, 2, 3]
+    mmio.writes.clear()
+    ip.write_regs({'c': 5, 'b': 6})
+    assert mmio.writes == [(slice(2, 3), [5]), (slice(1, 2), [6])]
+
+def test_transaction_read():
+    ip = FakeIP(DESCRIPTION)
+    mmio = ip.mmio.array
+    with ip.reg_transaction():
+        ip.c = 3
+        # reading a register that isn't shadowed flushes the pending writes first
+        assert ip.c == 3
+        assert mmio.writes == [(slice(2, 3), [3])]
+
+def test_transaction_per_thread():
+    ip = FakeIP(DESCRIPTION)
+    mmio = ip.mmio.array
+    with ip.reg_transaction():
+        ip.a = 1
+        thread = threading.Thread(target=setattr, args=(ip, 'c', 2))
+        thread.start()
+        thread.join()
+        # the other thread's write isn't deferred
+        assert mmio.writes == [(2, 2)]
+    assert mmio.writes == [(2, 2), (slice(0, 1), [1])]
+
+def test_tproc_shadow():
+    params = {k: '1' for k in ['PMEM_AW', 'DMEM_AW', 'WMEM_AW', 'REG_AW', 'IN_PORT_QTY', 'OUT_TRIG_QTY', 'OUT_DPORT_QTY', 'OUT_DPORT_DW', 'OUT_WPORT_QTY',
+                               'LFSR', 'DIVIDER', 'ARITH', 'TIME_READ', 'QCOM', 'CUSTOM_PERIPH', 'IO_CTRL', 'EXT_FLAG', 'QNET', 'FIFO_DEPTH', 'CALL_DEPTH', 'DEBUG']}
+    tproc = Axis_QICK_Proc({'type': 'QICK:QICK:qick_processor:2.0', 'fullpath': 'qick_processor_0', 'parameters': params})
+    tproc.cfg['revision'] = 23
+    mmio = tproc.mmio.array
+    tproc.start_src('external')
+    assert tproc.get_start_src() == 'external'
+    tproc.start_src('internal')
+    assert tproc.get_start_src() == 'internal'
+    assert mmio.data[1] == 0
+    # the read-modify-writes of tproc_cfg don't touch the hardware for the read
+    assert mmio.reads == 0
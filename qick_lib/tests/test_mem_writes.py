@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import pytest
+
+from qick import QickConfig
+from qick.asm_v2 import QickProgramV2
+
+SOCCFG = os.path.join(os.path.dirname(__file__), '..', '..', 'firmware', 'testbench', 'qick_testbench', 'soccfg.json')
+
+@pytest.fixture(scope='module')
+def soccfg():
+    return QickConfig(SOCCFG)
+
+def make_prog(soccfg, insts):
+    prog = QickProgramV2(soccfg)
+    for inst in insts:
+        prog.asm_inst(inst)
+    prog.compile()
+    return prog
+
+@pytest.mark.parametrize("insts, expected", [
+    ([], []),
+    ([{'CMD':'WPORT_WR', 'DST':'0', 'SRC':'r_wave', 'WW':'1', 'ADDR':'&3'}], ['wmem']),
+    ([{'CMD':'REG_WR', 'DST':'r_wave', 'SRC':'wmem', 'WW':'1', 'ADDR':'&3'}], ['wmem']),
+    ([{'CMD':'WMEM_WR', 'DST':'&3'}], ['wmem']),
+    ([{'CMD':'DMEM_WR', 'DST':'[&3]', 'SRC':'imm', 'LIT':'#1'}], ['dmem']),
+])
+def test_mem_writes(soccfg, insts, expected):
+    prog = make_prog(soccfg, insts)
+    assert prog.binprog['mem_writes'] == expected
+
+def test_reload_mem():
+    tproc_mod = pytest.importorskip("qick.drivers.tproc", exc_type=ImportError)
+
+    class FakeTproc(tproc_mod.Axis_QICK_Proc):
+        """tProc driver that records memory loads instead of doing DMA."""
+        def __init__(self):
+            self.binprog = None
+            self.mem_synced = set()
+            self.loads = []
+
+        def load_mem(self, mem_sel, buff_in, addr=0, check=True):
+            self.mem_synced.discard(mem_sel)
+            self.loads.append((mem_sel, check))
+
+    binprog = {'pmem': np.zeros((4, 8)), 'wmem': np.zeros((2, 8)), 'dmem': np.zeros(4), 'mem_writes': ['wmem']}
+    tproc = FakeTproc()
+    tproc.load_bin_program(binprog, load_mem=True)
+    assert tproc.loads == [('pmem', True), ('wmem', True), ('dmem', True)]
+    # only the memory the program writes is reloaded, and it's checked every time
+    for i in range(2):
+        tproc.loads.clear()
+        tproc.reload_mem()
+        assert tproc.loads == [('wmem', True)]
+    tproc.loads.clear()
+    tproc.reload_mem(force=True)
+    assert tproc.loads == [('wmem', True), ('dmem', True)]
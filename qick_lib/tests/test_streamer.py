@@ -0,0 +1,92 @@
+import time
+import numpy as np
+import pytest
+
+from qick.streamer import DataStreamer, ProcessDataStreamer
+
+class FakeSoc:
+    """Stands in for QickSoc: the shot counter advances at a fixed rate after start_tproc(),
+    and the accumulated buffer holds I = buffer address + 1000*channel, Q = -(buffer address).
+    """
+    def __init__(self, total, rate=50000, maxlen=2**12, nch=2, fail=False):
+        self.total = total
+        self.rate = rate
+        self.maxlen = maxlen
+        self.fail = fail
+        self.t_start = None
+        self.start_srcs = []
+        self.cfg = {'readouts': [{'avg_maxlen': maxlen} for ch in range(nch)]}
+
+    def __getitem__(self, key):
+        return self.cfg[key]
+
+    def start_tproc(self):
+        self.t_start = time.time()
+
+    def start_src(self, src):
+        self.start_srcs.append(src)
+
+    def get_tproc_counter(self, addr):
+        return min(int((time.time()-self.t_start)*self.rate), self.total)
+
+    def group_avg_dmas(self, ch_list):
+        return [list(range(len(ch_list)))]
+
+    def get_accumulated(self, ch, address, length, out=None):
+        if self.fail:
+            raise RuntimeError("DMA error")
+        addrs = (np.arange(length) + address) % self.maxlen
+        data = np.stack([addrs + 1000*ch, -addrs], axis=1).astype(np.int32)
+        if out is None:
+            return data
+        out[:] = data
+        return out
+
+def run_job(streamer, soc, nreads, zero_copy):
+    total = soc.total
+    out_bufs = [np.zeros((total, n, 2), dtype=np.int32) for n in nreads] if zero_copy else None
+    streamer.stop_flag.clear()
+    streamer.submit_job(total, 1, [0, 1], nreads, None, out_bufs)
+    results = [np.zeros((total*n, 2), dtype=np.int32) for n in nreads]
+    count = 0
+    while count < total:
+        for length, (data, stats) in streamer.poll_data(timeout=5):
+            if zero_copy:
+                assert data == count
+            else:
+                for i, n in enumerate(nreads):
+                    results[i][count*n:(count+length)*n] = data[i]
+            assert stats[1] >= count + length
+            count += length
+    assert streamer.done_flag.wait(5)
+    if zero_copy:
+        results = [buf.reshape((-1, 2)) for buf in out_bufs]
+    for ch, (n, result) in enumerate(zip(nreads, results)):
+        addrs = np.arange(total*n) % soc.maxlen
+        assert np.array_equal(result[:, 0], addrs + 1000*ch)
+        assert np.array_equal(result[:, 1], -addrs)
+
+@pytest.mark.parametrize('zero_copy', [False, True], ids=['queue', 'zero_copy'])
+@pytest.mark.parametrize('backend', [DataStreamer, ProcessDataStreamer], ids=['thread', 'process'])
+def test_streamer(backend, zero_copy):
+    soc = FakeSoc(total=10000)
+    streamer = backend(soc)
+    for i in range(2):
+        run_job(streamer, soc, [1, 2], zero_copy)
+        # the end-of-job reset of the start source must happen in this process
+        for i in range(100):
+            if soc.start_srcs: break
+            time.sleep(0.01)
+        assert soc.start_srcs == ['internal']
+        soc.start_srcs.clear()
+
+@pytest.mark.parametrize('backend', [DataStreamer, ProcessDataStreamer], ids=['thread', 'process'])
+def test_streamer_error(backend):
+    soc = FakeSoc(total=10000, fail=True)
+    streamer = backend(soc)
+    streamer.stop_flag.clear()
+    streamer.submit_job(soc.total, 1, [0, 1], [1, 1], None, None)
+    with pytest.raises(Exception):
+        for i in range(100):
+            streamer.poll_data(timeout=1)
+    assert streamer.done_flag.wait(5)